@@ -77,15 +77,134 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 
 # Performance optimizations for large file processing
-DATA_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024 * 1024  # 1GB
-FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024 * 1024  # 1GB
+# CSV uploads are streamed to disk by StreamingCSVUploadHandler, so only
+# regular form fields and other files count against these limits
+DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
+FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
+FILE_UPLOAD_HANDLERS = [
+    'uploads.upload_handlers.StreamingCSVUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
 
 # Celery optimizations for large files
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
 CELERY_TASK_SOFT_TIME_LIMIT = 25 * 60  # 25 minutes
 CELERY_WORKER_MAX_MEMORY_PER_CHILD = 500000  # 500MB
 CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True  # Redeliver so imports resume from their checkpoint
+# Starts of an import task (retries and redeliveries) before its batch is
+# failed; bounds the redelivery loop of a file that kills its worker
+IMPORT_MAX_ATTEMPTS = 5
 CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Run beat once per deployment (celery worker -B, or celery beat)
+CELERY_BEAT_SCHEDULE = {
+    'reclaim-import-slots': {
+        'task': 'uploads.tasks.reclaim_import_slots',
+        'schedule': 5 * 60,
+    },
+}
+
+# Bulk import engine for PostgreSQL staging loads: 'copy' or 'executemany'
+IMPORT_POSTGRES_ENGINE = 'copy'
+
+# Applied to the SQLite connection of each import (local development and CI).
+# WAL lets the status page read while chunks commit; NORMAL sync is still
+# crash-safe in WAL mode
+IMPORT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,  # KiB
+    'temp_store': 'MEMORY',
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+# Default CSV parser per batch: 'pandas' or 'arrow' (multi-threaded, needs
+# pyarrow). Arrow fails a batch on rows with fewer fields than the header,
+# which pandas pads with blanks; uploads can choose it per batch.
+IMPORT_READER_ENGINE = 'pandas'
+
+# 'changed' skips rewriting rows whose name/description/is_active are identical,
+# 'overwrite' rewrites every matching row
+IMPORT_UPSERT_MODE = 'changed'
+
+# Rows per chunk an import starts with. Unless IMPORT_ADAPTIVE_CHUNKS is
+# False, the size then adapts between the min and max: smaller for wide
+# rows so the import stays under IMPORT_CHUNK_MEMORY_LIMIT bytes of RSS
+# (None: 80% of CELERY_WORKER_MAX_MEMORY_PER_CHILD), larger while it
+# speeds up the database writes
+IMPORT_CHUNK_SIZE = 50000
+IMPORT_MIN_CHUNK_SIZE = 5000
+IMPORT_MAX_CHUNK_SIZE = 500000
+IMPORT_ADAPTIVE_CHUNKS = True
+IMPORT_CHUNK_MEMORY_LIMIT = None
+
+# Chunks parsed and transformed ahead of the database writer, per pipeline
+# stage; bounds memory at roughly (2 * DEPTH + 1) chunks. 0 disables the
+# pipeline and processes each chunk start to finish
+IMPORT_PIPELINE_DEPTH = 2
+
+# Worker processes that extract and validate fields, for imports whose
+# transform outruns one core; chunks are passed to them as Arrow buffers
+# (requires pyarrow). Each import starts its own pool. 0 transforms in the
+# pipeline's thread
+IMPORT_TRANSFORM_PROCESSES = 0
+
+# Results `manage.py benchmark_import --save-baseline` stores, and later
+# runs are compared against; machine specific, so kept per environment
+IMPORT_BENCHMARK_BASELINE = BASE_DIR / 'benchmarks' / 'baseline.json'
+
+# Files with at least this many records are split into byte ranges and
+# imported by this many Celery subtasks (PostgreSQL only). Opt-in: 1 keeps
+# every import serial
+IMPORT_PARALLEL_WORKERS = 1
+IMPORT_PARALLEL_MIN_RECORDS = 100000
+
+# Import scheduler. Files of up to FAST_LANE_MAX_RECORDS records run in the
+# fast lane, larger ones in the bulk lane; each lane has its own Celery queue
+# (run a worker for imports_fast apart from the one for celery,imports_bulk,
+# so parallel byte ranges in the bulk queue can't take every process).
+# Queued batches start as slots free up, within the per-lane, per-user and
+# overall limits; one bulk import at a time keeps large catalog loads from
+# competing for the same rows.
+IMPORT_FAST_LANE_MAX_RECORDS = 10000
+IMPORT_LANE_QUEUES = {'fast': 'imports_fast', 'bulk': 'imports_bulk'}
+IMPORT_MAX_CONCURRENT_IMPORTS = 4
+IMPORT_MAX_FAST_IMPORTS = 3
+IMPORT_MAX_BULK_IMPORTS = 1
+IMPORT_MAX_IMPORTS_PER_USER = 2
+# A slot not renewed for this long is reclaimed; defaults to CELERY_TASK_TIME_LIMIT
+IMPORT_SLOT_TIMEOUT = None
+
+# Bulk-load mode: imports of at least MIN_RECORDS rows into a products table
+# holding at most MAX_EXISTING_RATIO as many rows drop the non-unique
+# secondary indexes, load, then rebuild them (CONCURRENTLY on PostgreSQL).
+# Meant for initial loads and full refreshes; off by default.
+IMPORT_BULK_LOAD = False
+IMPORT_BULK_LOAD_MIN_RECORDS = 1000000
+IMPORT_BULK_LOAD_MAX_EXISTING_RATIO = 0.1
+
+# Rejected rows are spilled to a CSV under rejects/; only this many are kept
+# on the batch for display
+IMPORT_REJECTS_SAMPLE_SIZE = 100
+
+# Live progress goes to the channel layer at most every PUBLISH_INTERVAL
+# seconds; import checkpoints (and the counters the status page polls) are
+# written to the database every SAVE_INTERVAL seconds
+IMPORT_PROGRESS_PUBLISH_INTERVAL = 0.5
+IMPORT_PROGRESS_SAVE_INTERVAL = 5.0
+
+# Live import counters, read by status polling and the WebSocket consumer
+# instead of the database; set to None to read ImportBatch directly
+IMPORT_COUNTERS_REDIS_URL = 'redis://127.0.0.1:6379/1'
+IMPORT_COUNTERS_TTL = 24 * 60 * 60
+
+# Status polling: database snapshots are cached this long, and unfinished
+# imports tell pollers to come back after POLL_INTERVAL seconds (Retry-After).
+# The SSE stream sends a keep-alive comment every KEEPALIVE seconds.
+IMPORT_STATUS_CACHE_SECONDS = 1
+IMPORT_STATUS_POLL_INTERVAL = 2
+IMPORT_SSE_KEEPALIVE = 15
 
 ROOT_URLCONF = 'product_importer.urls'
 
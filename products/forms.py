@@ -1,5 +1,5 @@
 from django import forms
-from .models import Product
+from .models import Product, normalize_sku
 
 class ProductForm(forms.ModelForm):
     class Meta:
@@ -8,4 +8,7 @@ class ProductForm(forms.ModelForm):
         widgets = {
             'description': forms.Textarea(attrs={'rows': 4}),
         }
-        
\ No newline at end of file
+
+    def clean_sku(self):
+        # Normalized before the unique check, so 'abc' clashes with 'ABC' as a form error
+        return normalize_sku(self.cleaned_data['sku'])
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.8 on 2026-10-17 05:09
+
+from django.db import migrations, models
+
+
+def canonicalize_skus(apps, schema_editor):
+    """Store every SKU stripped and uppercase, so exact lookups find variants.
+    
+    Rows are never removed here: if variants collide with each other or
+    with a canonical row, the migration fails and lists their ids, to be
+    merged or renamed by hand before running it again.
+    """
+    Product = apps.get_model('products', 'Product')
+    variants = {}
+    for product_id, sku in Product.objects.values_list('id', 'sku').iterator(chunk_size=10000):
+        canonical = sku.strip().upper()
+        if canonical != sku:
+            variants.setdefault(canonical, []).append(product_id)
+    
+    canonicals = list(variants)
+    existing = {}
+    for start in range(0, len(canonicals), 1000):
+        existing.update(
+            Product.objects.filter(sku__in=canonicals[start:start + 1000]).values_list('sku', 'id')
+        )
+    
+    collisions = {
+        canonical: sorted(ids + ([existing[canonical]] if canonical in existing else []))
+        for canonical, ids in variants.items()
+        if len(ids) > 1 or canonical in existing
+    }
+    if collisions:
+        listed = '\n'.join(f"  {canonical}: product ids {ids}" for canonical, ids in sorted(collisions.items()))
+        raise RuntimeError(
+            f"{len(collisions)} SKU(s) differ only in case or surrounding whitespace. "
+            f"Merge or rename these products, then migrate again:\n{listed}"
+        )
+    
+    for canonical, (product_id,) in variants.items():
+        Product.objects.filter(id=product_id).update(sku=canonical)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_product_products_pr_sku_ca0cdc_idx_and_more'),
+    ]
+
+    operations = [
+        # Canonical SKUs are valid before this migration too, so there is nothing to undo
+        migrations.RunPython(canonicalize_skus, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='products_pr_sku_ca0cdc_idx',
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(help_text='Stock Keeping Unit (case-insensitive, stored uppercase)', max_length=100, unique=True),
+        ),
+    ]
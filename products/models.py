@@ -1,11 +1,22 @@
 from django.db import models
 
+
+def normalize_sku(sku):
+    """Canonical SKU: stored and looked up uppercase, so matching is case-insensitive"""
+    return str(sku).strip().upper()
+
+
+class ProductQuerySet(models.QuerySet):
+    def by_sku(self, sku):
+        """Case-insensitive SKU match that uses the unique index on ``sku``"""
+        return self.filter(sku=normalize_sku(sku))
+
+
 class Product(models.Model):
     sku = models.CharField(
         max_length=100, 
         unique=True, 
-        db_index=True,
-        help_text="Stock Keeping Unit (case-insensitive)"
+        help_text="Stock Keeping Unit (case-insensitive, stored uppercase)"
     )
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
@@ -13,9 +24,10 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ProductQuerySet.as_manager()
+    
     class Meta:
         indexes = [
-            models.Index(fields=['sku']),
             models.Index(fields=['is_active']),
             models.Index(fields=['created_at']),
         ]
@@ -25,5 +37,5 @@ class Product(models.Model):
         return f"{self.sku} - {self.name}"
     
     def save(self, *args, **kwargs):
-        self.sku = self.sku.upper()
+        self.sku = normalize_sku(self.sku)
         super().save(*args, **kwargs)
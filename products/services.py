@@ -1,7 +1,7 @@
 from django.db import transaction
 from django.db.models import Q
 import logging
-from .models import Product
+from .models import Product, normalize_sku
 from webhooks.services import WebhookService
 
 logger = logging.getLogger(__name__)
@@ -14,8 +14,8 @@ class ProductService:
             sku = product_data['sku']
             
             with transaction.atomic():
-                # Find existing product (case-insensitive)
-                existing_product = Product.objects.filter(sku__iexact=sku).first()
+                # Find existing product (case-insensitive, through the canonical SKU)
+                existing_product = Product.objects.by_sku(sku).first()
                 
                 if existing_product:
                     # Update existing product
@@ -72,13 +72,14 @@ class ProductSearchService:
         # Apply filters
         if search_term:
             queryset = queryset.filter(
-                Q(sku__icontains=search_term) |
+                Q(sku__contains=normalize_sku(search_term)) |
                 Q(name__icontains=search_term) |
                 Q(description__icontains=search_term)
             )
         
+        # SKUs are stored uppercase, so no UPPER() around the column is needed
         if sku:
-            queryset = queryset.filter(sku__icontains=sku)
+            queryset = queryset.filter(sku__contains=normalize_sku(sku))
         
         if name:
             queryset = queryset.filter(name__icontains=name)
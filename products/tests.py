@@ -1,3 +1,56 @@
-from django.test import TestCase
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
 
-# Create your tests here.
+from .forms import ProductForm
+from .models import Product
+
+
+class ProductFormTests(TestCase):
+
+    def test_sku_is_normalized(self):
+        form = ProductForm(data={'sku': ' abc-1 ', 'name': 'Anvil', 'is_active': True})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['sku'], 'ABC-1')
+
+    def test_sku_differing_only_in_case_is_a_duplicate(self):
+        Product.objects.create(sku='ABC', name='Anvil')
+        form = ProductForm(data={'sku': 'abc', 'name': 'Another anvil', 'is_active': True})
+        self.assertFalse(form.is_valid())
+        self.assertIn('sku', form.errors)
+
+
+class CanonicalSkuMigrationTests(TransactionTestCase):
+    before = [('products', '0002_product_products_pr_sku_ca0cdc_idx_and_more')]
+    after = [('products', '0003_product_canonical_sku')]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.executor.migrate(self.before)
+        self.executor.loader.build_graph()
+        self.addCleanup(self.migrate_to_latest)
+        self.Product = self.executor.loader.project_state(self.before).apps.get_model('products', 'Product')
+
+    def migrate_to_latest(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate(self):
+        self.executor.loader.build_graph()
+        self.executor.migrate(self.after)
+
+    def test_variants_are_canonicalized(self):
+        lower = self.Product.objects.create(sku='abc', name='Lower')
+        padded = self.Product.objects.create(sku=' DEF\t', name='Padded')
+        self.migrate()
+        self.assertEqual(Product.objects.get(id=lower.id).sku, 'ABC')
+        self.assertEqual(Product.objects.get(id=padded.id).sku, 'DEF')
+
+    def test_collisions_fail_without_deleting_rows(self):
+        canonical = self.Product.objects.create(sku='ABC', name='Canonical')
+        variant = self.Product.objects.create(sku='abc', name='Variant')
+        with self.assertRaisesMessage(RuntimeError, f"ABC: product ids {[canonical.id, variant.id]}"):
+            self.migrate()
+        self.assertEqual(self.Product.objects.count(), 2)
+        self.Product.objects.filter(id=variant.id).update(sku='ABC-2')
@@ -5,8 +5,8 @@ from .models import ImportBatch
 
 @admin.register(ImportBatch)
 class ImportBatchAdmin(admin.ModelAdmin):
-    list_display = ['file_name', 'status', 'total_records', 'processed_records', 'created_by', 'created_at']
-    list_filter = ['status', 'created_at']
+    list_display = ['file_name', 'status', 'total_records', 'processed_records', 'created_records', 'updated_records', 'unchanged_records', 'created_by', 'created_at']
+    list_filter = ['status', 'reader_engine', 'created_at']
     readonly_fields = ['created_at', 'completed_at']
     search_fields = ['file_name']
     
@@ -0,0 +1,203 @@
+"""Import benchmarks over synthetic product catalogs.
+
+``generate_catalog`` writes a deterministic CSV for a seed, and
+``run_import`` pushes it through ``UltraFastCSVProcessor`` exactly as the
+serial Celery task does, timing each phase and sampling the RSS while it
+runs. Driven by the ``benchmark_import`` management command.
+"""
+import csv
+import json
+import os
+import random
+import threading
+import time
+
+import psutil
+from django.db import connection
+
+from products.models import Product
+from uploads.bulk_services import UltraFastCSVProcessor
+from uploads.models import ImportBatch
+
+# Catalog shapes; command line options override any of these
+SCENARIOS = {
+    'narrow': {'description_length': 0},
+    'catalog': {'description_length': 200},
+    'wide': {'description_length': 2000},
+    'dirty': {
+        'description_length': 200,
+        'duplicate_ratio': 0.05,
+        'invalid_ratio': 0.02,
+        'aliases': True,
+        'encoding': 'latin-1',
+    },
+}
+
+# Header names the column resolver has to find by substring, as in real exports
+ALIAS_HEADERS = ['Item SKU', 'Product Name', 'Product Description']
+PLAIN_HEADERS = ['sku', 'name', 'description']
+
+# Latin-1 encodable, so every supported encoding can write them
+WORDS = [
+    'acme', 'anvil', 'rocket', 'widget', 'gadget', 'steel', 'copper', 'deluxe',
+    'compact', 'portable', 'crème', 'café', 'jalapeño', 'façade', 'naïve', 'über',
+    'premium', 'classic', 'outdoor', 'kitchen', 'garden', 'travel', 'studio', 'pro',
+]
+
+
+def generate_catalog(path, rows, seed=0, description_length=200, duplicate_ratio=0.0,
+                     invalid_ratio=0.0, aliases=False, encoding='utf-8'):
+    """Write a synthetic catalog CSV; the same arguments always give the same file.
+
+    ``duplicate_ratio`` of the rows repeat an earlier SKU in lowercase, so
+    they update instead of create, and ``invalid_ratio`` have a blank SKU
+    and are rejected. Returns the counts a correct import must end with.
+    """
+    rng = random.Random(seed)
+    text = ' '.join(rng.choice(WORDS) for _ in range(max(description_length, 1) // 4 + 16384))
+    headers = ALIAS_HEADERS if aliases else PLAIN_HEADERS
+    if not description_length:
+        headers = headers[:2]
+
+    skus = []
+    invalid = 0
+    with open(path, 'w', encoding=encoding, newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        for i in range(rows):
+            draw = rng.random()
+            if draw < invalid_ratio:
+                sku = ' '
+                invalid += 1
+            elif draw < invalid_ratio + duplicate_ratio and skus:
+                sku = rng.choice(skus).lower()
+            else:
+                sku = f'BENCH-{i:09d}'
+                skus.append(sku)
+
+            row = [sku, f'{rng.choice(WORDS).title()} {rng.choice(WORDS)} {i}']
+            if description_length:
+                start = rng.randrange(len(text) - description_length)
+                row.append(text[start:start + description_length])
+            writer.writerow(row)
+
+    return {
+        'rows': rows,
+        'successful': rows - invalid,
+        'failed': invalid,
+        'products': len(skus),
+    }
+
+
+class MemorySampler:
+    """Peak RSS per import phase, sampled from a background thread.
+
+    Samples are attributed to ``timer.current``; time outside any phase
+    (setup, checkpoints between chunks and the like) counts as 'other'.
+    """
+
+    def __init__(self, timer, interval=0.05):
+        self.timer = timer
+        self.interval = interval
+        self.peaks = {}
+        self._process = psutil.Process()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='benchmark-memory', daemon=True)
+
+    def _run(self):
+        while True:
+            self.sample()
+            if self._stopped.wait(self.interval):
+                return
+
+    def sample(self):
+        phase = self.timer.current or 'other'
+        self.peaks[phase] = max(self.peaks.get(phase, 0), self._process.memory_info().rss)
+
+    @property
+    def peak(self):
+        return max(self.peaks.values(), default=0)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+        self.sample()
+
+
+def run_import(path, total_records, reader_engine=None):
+    """Import ``path`` into the current database; returns its measurements"""
+    batch = ImportBatch.objects.create(
+        file_name=os.path.basename(path), total_records=total_records, file_path=path
+    )
+    processor = UltraFastCSVProcessor(reader_engine=reader_engine)
+    with MemorySampler(processor.timer) as sampler:
+        start = time.monotonic()
+        processor.process_large_csv(path, batch.id)
+        seconds = time.monotonic() - start
+    batch.refresh_from_db()
+
+    phases = {}
+    for name, phase_seconds in processor.timer.seconds.items():
+        phases[name] = {
+            'seconds': phase_seconds,
+            'rows_per_sec': round(batch.processed_records / phase_seconds) if phase_seconds else 0,
+            'peak_memory': sampler.peaks.get(name, 0),
+        }
+    return {
+        'vendor': connection.vendor,
+        'engine': processor.engine_name,
+        'reader': processor.reader_engine,
+        'rows': batch.processed_records,
+        'successful': batch.successful_records,
+        'failed': batch.failed_records,
+        'created': batch.created_records,
+        'updated': batch.updated_records,
+        'unchanged': batch.unchanged_records,
+        'products': Product.objects.count(),
+        'seconds': round(seconds, 3),
+        'rows_per_sec': round(batch.processed_records / seconds) if seconds else 0,
+        'peak_memory': sampler.peak,
+        'chunk_sizes': batch.chunk_sizes,
+        'phases': phases,
+    }
+
+
+def check_counts(result, expected):
+    """Differences between an import's counts and the catalog's; empty if it was correct"""
+    return [
+        f"{key}: expected {expected[key]}, got {result[key]}"
+        for key in ('rows', 'successful', 'failed', 'products')
+        if result[key] != expected[key]
+    ]
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baselines(path, baselines):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(result, baseline, tolerance):
+    """Regressions of ``result`` against its baseline, beyond ``tolerance`` (a fraction)"""
+    regressions = []
+    if result['rows_per_sec'] < baseline['rows_per_sec'] * (1 - tolerance):
+        regressions.append(
+            f"throughput {result['rows_per_sec']:,} rows/sec vs {baseline['rows_per_sec']:,}"
+        )
+    if result['peak_memory'] > baseline['peak_memory'] * (1 + tolerance):
+        regressions.append(
+            f"peak memory {result['peak_memory'] / 2 ** 20:.0f} MiB vs {baseline['peak_memory'] / 2 ** 20:.0f} MiB"
+        )
+    return regressions
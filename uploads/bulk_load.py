@@ -0,0 +1,175 @@
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+from uploads.models import ImportBatch
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_TABLE = 'products_product'
+
+
+class PhaseTimer:
+    """Wall-clock seconds per named phase of an import"""
+
+    def __init__(self, seconds=None):
+        self.seconds = dict(seconds or {})
+        # Phase in progress, for anything watching the import (the benchmark's memory sampler)
+        self.current = None
+
+    @contextmanager
+    def phase(self, name):
+        outer, self.current = self.current, name
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, time.monotonic() - start)
+            self.current = outer
+
+    def add(self, name, seconds):
+        self.seconds[name] = round(self.seconds.get(name, 0.0) + seconds, 3)
+
+    def __str__(self):
+        return ', '.join(f'{name} {seconds:.2f}s' for name, seconds in self.seconds.items())
+
+
+class SecondaryIndexes:
+    """Non-unique indexes of a table, which a bulk load can drop and rebuild.
+
+    The primary key and unique indexes always stay: the upsert's
+    ``ON CONFLICT (sku)`` needs the unique SKU index. On PostgreSQL indexes
+    are dropped and rebuilt ``CONCURRENTLY``, so other imports and readers
+    are never blocked; that requires autocommit, i.e. no open transaction.
+    Other backends without index introspection here get an empty list.
+    """
+
+    def __init__(self, table=PRODUCT_TABLE):
+        self.table = table
+
+    def definitions(self):
+        """``{'name', 'sql'}`` for every droppable (and, on PostgreSQL, valid) index"""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute("""
+                    SELECT index_class.relname, pg_get_indexdef(index_class.oid)
+                    FROM pg_index
+                    JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid
+                    WHERE pg_index.indrelid = %s::regclass
+                      AND NOT pg_index.indisunique
+                      AND NOT pg_index.indisprimary
+                      AND pg_index.indisvalid
+                    ORDER BY index_class.relname
+                """, [self.table])
+            elif connection.vendor == 'sqlite':
+                # Unique column constraints are autoindexes without SQL
+                cursor.execute("""
+                    SELECT name, sql FROM sqlite_master
+                    WHERE type = 'index' AND tbl_name = %s AND sql IS NOT NULL
+                      AND upper(sql) NOT LIKE 'CREATE UNIQUE%%'
+                    ORDER BY name
+                """, [self.table])
+            else:
+                return []
+            return [{'name': name, 'sql': sql} for name, sql in cursor.fetchall()]
+
+    def drop(self):
+        """Drop the secondary indexes; returns their definitions for ``rebuild``"""
+        definitions = self.definitions()
+        concurrently = 'CONCURRENTLY ' if connection.vendor == 'postgresql' else ''
+        with connection.cursor() as cursor:
+            for index in definitions:
+                cursor.execute(f"DROP INDEX {concurrently}IF EXISTS {connection.ops.quote_name(index['name'])}")
+        return definitions
+
+    def rebuild(self, definitions):
+        """Recreate dropped indexes that are missing or left invalid by a failed build"""
+        existing = {index['name'] for index in self.definitions()}
+        postgres = connection.vendor == 'postgresql'
+        with connection.cursor() as cursor:
+            for index in definitions:
+                if index['name'] in existing:
+                    continue
+                if postgres:
+                    # An interrupted CREATE INDEX CONCURRENTLY leaves an invalid index behind
+                    cursor.execute(
+                        f"DROP INDEX CONCURRENTLY IF EXISTS {connection.ops.quote_name(index['name'])}"
+                    )
+                    cursor.execute(index['sql'].replace('CREATE INDEX ', 'CREATE INDEX CONCURRENTLY ', 1))
+                else:
+                    cursor.execute(index['sql'])
+
+
+def table_rows(table=PRODUCT_TABLE):
+    """Row count of ``table``; PostgreSQL's planner estimate, which is free"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+            return max(cursor.fetchone()[0], 0)
+        cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}")
+        return cursor.fetchone()[0]
+
+
+def bulk_load_applies(incoming_records, enabled=None):
+    """Whether to drop secondary indexes for a load of ``incoming_records``.
+
+    Opt-in with ``IMPORT_BULK_LOAD``. Only worth it when the load dwarfs
+    what is already in the table: at least ``IMPORT_BULK_LOAD_MIN_RECORDS``
+    records, with existing rows at most ``IMPORT_BULK_LOAD_MAX_EXISTING_RATIO``
+    of them. Rebuilding indexes over a large existing catalog costs more
+    than maintaining them row by row.
+    """
+    if enabled is None:
+        enabled = getattr(settings, 'IMPORT_BULK_LOAD', False)
+    if not enabled or connection.vendor not in ('postgresql', 'sqlite'):
+        return False
+    if incoming_records < getattr(settings, 'IMPORT_BULK_LOAD_MIN_RECORDS', 1000000):
+        return False
+    max_ratio = getattr(settings, 'IMPORT_BULK_LOAD_MAX_EXISTING_RATIO', 0.1)
+    return table_rows() <= incoming_records * max_ratio
+
+
+def drop_indexes(batch, timer):
+    """Drop secondary indexes for ``batch``, recording them so they can't be lost.
+
+    A redelivered task finds its indexes already gone; the ones recorded by
+    the earlier attempt are kept.
+    """
+    with timer.phase('drop_indexes'):
+        dropped = SecondaryIndexes().drop()
+    recorded = {index['name'] for index in batch.dropped_indexes}
+    batch.dropped_indexes = batch.dropped_indexes + [index for index in dropped if index['name'] not in recorded]
+    batch.save(update_fields=['dropped_indexes'])
+    logger.info(
+        f"Bulk load for batch {batch.id}: dropped {len(batch.dropped_indexes)} secondary indexes"
+    )
+
+
+def rebuild_indexes(batch, timer):
+    """Rebuild what ``drop_indexes`` dropped; a no-op if nothing was"""
+    if not batch.dropped_indexes:
+        return
+    with timer.phase('rebuild_indexes'):
+        SecondaryIndexes().rebuild(batch.dropped_indexes)
+    batch.dropped_indexes = []
+    batch.save(update_fields=['dropped_indexes'])
+    logger.info(f"Bulk load for batch {batch.id}: secondary indexes rebuilt")
+
+
+def restore_abandoned_indexes(exclude_batch_id=None):
+    """Rebuild indexes left dropped by bulk loads whose worker died.
+
+    Called before each import; a batch that is still processing owns its
+    dropped indexes and is left alone.
+    """
+    abandoned = (
+        ImportBatch.objects.exclude(dropped_indexes=[])
+        .exclude(status='processing')
+        .exclude(id=exclude_batch_id)
+    )
+    for batch in abandoned:
+        logger.warning(f"Restoring secondary indexes dropped by batch {batch.id}")
+        rebuild_indexes(batch, PhaseTimer())
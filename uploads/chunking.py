@@ -0,0 +1,112 @@
+import logging
+
+import psutil
+from django.conf import settings
+
+from uploads.pipeline import pipeline_depth
+
+logger = logging.getLogger(__name__)
+
+# A chunk's records are only part of what it costs: the parsed chunk, the
+# extracted columns and the write's parameters are alive at the same time
+ROW_MEMORY_OVERHEAD = 3
+
+# Throughput and size changes smaller than this are noise, not a reason to resize
+TOLERANCE = 0.05
+
+GROWTH_FACTOR = 1.5
+
+
+def memory_limit():
+    """RSS an import should stay under, in bytes; None if unbounded.
+
+    ``IMPORT_CHUNK_MEMORY_LIMIT`` if set, otherwise 80% of Celery's
+    ``CELERY_WORKER_MAX_MEMORY_PER_CHILD`` (which is in KiB), so a worker
+    isn't recycled for memory it only needed mid-import.
+    """
+    limit = getattr(settings, 'IMPORT_CHUNK_MEMORY_LIMIT', None)
+    if limit:
+        return limit
+    per_child = getattr(settings, 'CELERY_WORKER_MAX_MEMORY_PER_CHILD', None)
+    return int(per_child * 1024 * 0.8) if per_child else None
+
+
+def chunks_in_flight():
+    """Chunks held in memory at once: the pipeline's queues, the pool's window and the writer's"""
+    depth = max(pipeline_depth(), 0)
+    processes = getattr(settings, 'IMPORT_TRANSFORM_PROCESSES', 0)
+    return 2 * depth + 1 + (processes + depth if processes > 0 else 0)
+
+
+class ChunkSizer:
+    """Rows per chunk, adapted to the import's memory use and write throughput.
+
+    After every chunk, ``observe`` is given its row count, the bytes its
+    records take and how long writing them took:
+
+    * Memory caps the size: with ``chunks_in_flight`` chunks alive, rows of
+      the observed width must fit between the RSS at the start and
+      ``memory_limit``. Wide, description-heavy files get smaller chunks.
+      If the RSS still grows past the limit anyway, the size is halved, and
+      never grows back past the halved size.
+    * Throughput moves it within that cap: while rows/sec per write keeps
+      improving the size grows, and once a larger size writes slower it
+      goes back to the best one seen. Narrow files get larger chunks.
+
+    The pipeline reads ahead, so a new size reaches the writer a few chunks
+    later; chunks read at an older size don't count as evidence for the
+    current one. With ``IMPORT_ADAPTIVE_CHUNKS`` off the size stays fixed,
+    but peak memory is still recorded.
+    """
+
+    def __init__(self, size=None, adaptive=None):
+        self.minimum = getattr(settings, 'IMPORT_MIN_CHUNK_SIZE', 5000)
+        self.maximum = getattr(settings, 'IMPORT_MAX_CHUNK_SIZE', 500000)
+        self.adaptive = getattr(settings, 'IMPORT_ADAPTIVE_CHUNKS', True) if adaptive is None else adaptive
+        size = size or getattr(settings, 'IMPORT_CHUNK_SIZE', 50000)
+        self.size = self._clamp(size) if self.adaptive else size
+        self.sizes = [self.size]
+        self.memory_limit = memory_limit()
+        self.in_flight = chunks_in_flight()
+        self._process = psutil.Process()
+        self._baseline = self._process.memory_info().rss
+        self.peak_memory = self._baseline
+        self._best_rate = 0.0
+        self._best_size = self.size
+        self._ceiling = self.maximum
+
+    def _clamp(self, size):
+        return max(self.minimum, min(self.maximum, int(size)))
+
+    def observe(self, rows, record_bytes, seconds):
+        """Record one written chunk; returns the size for the next one"""
+        rss = self._process.memory_info().rss
+        growing = rss > self.peak_memory
+        self.peak_memory = max(self.peak_memory, rss)
+        if not self.adaptive or not rows:
+            return self.size
+
+        target = self.size
+        if rows == self.size and seconds > 0:
+            rate = rows / seconds
+            if rate > self._best_rate * (1 + TOLERANCE):
+                self._best_rate, self._best_size = rate, rows
+                target = rows * GROWTH_FACTOR
+            elif rate < self._best_rate * (1 - TOLERANCE):
+                target = self._best_size
+
+        if self.memory_limit:
+            row_bytes = max(record_bytes / rows, 1) * ROW_MEMORY_OVERHEAD
+            headroom = max(self.memory_limit - self._baseline, 0)
+            target = min(target, headroom / (self.in_flight * row_bytes))
+            # The allocator rarely gives memory back, so only react while it still grows
+            if rss > self.memory_limit and growing:
+                self._ceiling = min(self._ceiling, self.size / 2)
+            target = min(target, self._ceiling)
+
+        size = self._clamp(target)
+        if abs(size - self.size) > self.size * TOLERANCE:
+            logger.debug(f"Chunk size {self.size} -> {size} (RSS {rss / 2 ** 20:.0f} MiB)")
+            self.size = size
+            self.sizes.append(size)
+        return size
@@ -0,0 +1,184 @@
+import gzip
+import io
+import struct
+import zipfile
+import zlib
+
+# Accepted upload suffixes and the compression each one implies
+COMPRESSION_SUFFIXES = {
+    '.csv.gz': 'gzip',
+    '.csv.zst': 'zstd',
+    '.zip': 'zip',
+}
+ACCEPTED_SUFFIXES = ('.csv',) + tuple(COMPRESSION_SUFFIXES)
+
+
+def compression_for(file_name):
+    """Compression implied by the file name, or None for plain CSV"""
+    name = str(file_name).lower()
+    for suffix, compression in COMPRESSION_SUFFIXES.items():
+        if name.endswith(suffix):
+            return compression
+    return None
+
+
+def is_accepted(file_name):
+    return str(file_name).lower().endswith(ACCEPTED_SUFFIXES)
+
+
+def zstd_available():
+    try:
+        import zstandard
+    except ImportError:
+        return False
+    return True
+
+
+def open_import_stream(file_path, offset=0):
+    """Binary stream of the CSV text, decompressing on the fly.
+
+    ``offset`` is a position in the decompressed text; compressed streams
+    reach it by decompressing forward, never by inflating to disk.
+    """
+    compression = compression_for(file_path)
+
+    if compression == 'gzip':
+        stream = gzip.open(file_path, 'rb')
+    elif compression == 'zstd':
+        import zstandard
+        reader = zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'), closefd=True)
+        stream = io.BufferedReader(reader, buffer_size=1024 * 1024)  # Adds readline()
+    elif compression == 'zip':
+        # The open member keeps the archive's file handle alive
+        with zipfile.ZipFile(file_path) as archive:
+            stream = archive.open(single_zip_entry(archive))
+    else:
+        stream = open(file_path, 'rb')
+
+    if offset and not compression:
+        stream.seek(offset)
+    elif offset:
+        # Decompress forward and discard up to the offset
+        remaining = offset
+        while remaining > 0:
+            skipped = len(stream.read(min(remaining, 1024 * 1024)))
+            if not skipped:
+                break
+            remaining -= skipped
+    return stream
+
+
+def single_zip_entry(archive):
+    """The only non-empty member of an archive, which must be a CSV"""
+    entries = [info for info in archive.infolist() if not info.is_dir() and info.file_size]
+    if len(entries) != 1 or not entries[0].filename.lower().endswith('.csv'):
+        raise ValueError("ZIP uploads must contain exactly one .csv file")
+    return entries[0]
+
+
+class IncrementalDecompressor:
+    """Decompress an upload chunk by chunk as it is received"""
+
+    def __init__(self, compression):
+        self.compression = compression
+        self._head = b''
+        self._zip_stored_remaining = None
+        self._zip_skip = 0  # Bytes of a skipped entry still to discard
+        self._zip_descriptor = False  # Whether a data descriptor follows them
+
+        if compression == 'gzip':
+            self._decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        elif compression == 'zstd':
+            import zstandard
+            self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+        elif compression == 'zip':
+            self._decompressor = None  # Created once the local header is parsed
+        else:
+            raise ValueError(f"Unknown compression: {compression}")
+
+    def feed(self, data):
+        if self.compression == 'zip':
+            return self._feed_zip(data)
+        if self.compression == 'gzip':
+            return self._feed_gzip(data)
+        return self._decompressor.decompress(data)
+
+    def _feed_gzip(self, data):
+        output = self._decompressor.decompress(data)
+        # Concatenated gzip members
+        while self._decompressor.eof and self._decompressor.unused_data:
+            unused = self._decompressor.unused_data
+            self._decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+            output += self._decompressor.decompress(unused)
+        return output
+
+    def _feed_zip(self, data):
+        if self._decompressor is None and self._zip_stored_remaining is None:
+            self._head += data
+            data = self._next_zip_entry()
+            if data is None:
+                return b''
+
+        if self._zip_stored_remaining is not None:
+            output = data[:self._zip_stored_remaining]
+            self._zip_stored_remaining -= len(output)
+            return output
+
+        # Anything after the entry's deflate stream is ignored here
+        if self._decompressor.eof:
+            return b''
+        return self._decompressor.decompress(data)
+
+    def _next_zip_entry(self):
+        """Parse local headers in ``_head`` up to the first entry with data.
+
+        Directories and empty files ahead of it are skipped. Returns the
+        entry's first bytes, or None until more of the upload arrives.
+        """
+        while True:
+            skipped = min(self._zip_skip, len(self._head))
+            self._head, self._zip_skip = self._head[skipped:], self._zip_skip - skipped
+            if self._zip_skip:
+                return None
+            if self._zip_descriptor:
+                # Optional signature, then CRC and both sizes
+                if len(self._head) < 4:
+                    return None
+                self._zip_skip = 16 if self._head.startswith(b'PK\x07\x08') else 12
+                self._zip_descriptor = False
+                continue
+
+            if len(self._head) < 30:
+                return None
+            signature, flags, method, compressed_size, size, name_length, extra_length = struct.unpack(
+                '<I2xHH8xIIHH', self._head[:30]
+            )
+            if signature == 0x02014b50:
+                # Central directory: every entry was skipped
+                raise ValueError("ZIP uploads must contain exactly one .csv file")
+            if signature != 0x04034b50:
+                raise ValueError("Not a ZIP archive")
+
+            start = 30 + name_length + extra_length
+            if len(self._head) < start:
+                return None
+
+            has_descriptor = bool(flags & 0x08)
+            if self._head[30:30 + name_length].endswith(b'/') or (not size and not has_descriptor):
+                if has_descriptor and method != zipfile.ZIP_STORED:
+                    raise ValueError("Unsupported ZIP layout")
+                # Sizes are zero in the header when a descriptor follows;
+                # a stored directory has no data anyway
+                self._zip_skip = start + (0 if has_descriptor else compressed_size)
+                self._zip_descriptor = has_descriptor
+                continue
+
+            if method == zipfile.ZIP_DEFLATED:
+                self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            elif method == zipfile.ZIP_STORED and not has_descriptor:
+                self._zip_stored_remaining = compressed_size
+            else:
+                raise ValueError("Unsupported ZIP compression method")
+
+            data, self._head = self._head[start:], b''
+            return data
@@ -34,23 +34,13 @@ class UploadProgressConsumer(AsyncWebsocketConsumer):
 
     @database_sync_to_async
     def get_batch_data(self):
-        """Get batch data from database"""
+        """Get batch data from the hot counters, or the database once they've expired"""
         try:
-            from .models import ImportBatch
-            batch = ImportBatch.objects.get(id=self.batch_id)
-            progress = 0
-            if batch.total_records > 0:
-                progress = int((batch.processed_records / batch.total_records) * 100)
-            
-            return {
-                'batch_id': str(batch.id),
-                'status': batch.status,
-                'processed': batch.processed_records,
-                'total': batch.total_records,
-                'successful': batch.successful_records,
-                'failed': batch.failed_records,
-                'progress': progress
-            }
+            from .progress import batch_progress_snapshot
+            snapshot = batch_progress_snapshot(self.batch_id)
+            if snapshot is None:
+                return None
+            return {**snapshot, 'batch_id': str(self.batch_id)}
         except Exception as e:
             logger.error(f"Error getting batch data: {e}")
             return None
@@ -0,0 +1,178 @@
+import json
+import os
+import platform
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from products.models import Product
+from uploads import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the import pipeline on synthetic catalogs, in a throwaway test database. "
+        "Every scenario is imported into an empty table, then re-imported over itself; "
+        "results are compared against the stored baselines."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help="Rows per catalog")
+        parser.add_argument(
+            '--scenario', action='append', choices=sorted(benchmark.SCENARIOS),
+            help="Catalog shape to run; repeat for several (default: all)"
+        )
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the catalog generator")
+        parser.add_argument('--reader', choices=['pandas', 'arrow'], help="CSV reader engine")
+        parser.add_argument('--description-length', type=int, help="Characters per description; 0 for none")
+        parser.add_argument('--duplicate-ratio', type=float, help="Share of rows repeating an earlier SKU")
+        parser.add_argument('--invalid-ratio', type=float, help="Share of rows without a SKU")
+        parser.add_argument('--aliases', action='store_true', default=None, help="Use export-style header names")
+        parser.add_argument('--encoding', help="Text encoding of the catalogs")
+        parser.add_argument(
+            '--database-url',
+            help="Benchmark this database (e.g. postgres://localhost/importer) instead of the default one; "
+                 "a test database is created next to it, so the user needs CREATEDB"
+        )
+        parser.add_argument('--work-dir', help="Where catalogs and rejects files go (default: a temporary directory)")
+        parser.add_argument('--keep-files', action='store_true', help="Keep the work directory")
+        parser.add_argument('--output', help="Also write the full results as JSON to this file")
+        parser.add_argument(
+            '--baseline', default=str(getattr(settings, 'IMPORT_BENCHMARK_BASELINE', 'benchmarks/baseline.json')),
+            help="Baseline results file"
+        )
+        parser.add_argument('--save-baseline', action='store_true', help="Store these results as the new baseline")
+        parser.add_argument(
+            '--tolerance', type=float, default=0.15,
+            help="Allowed throughput drop or memory growth against the baseline, as a fraction"
+        )
+        parser.add_argument(
+            '--fail-on-regression', action='store_true', help="Exit with an error if anything regressed"
+        )
+
+    def handle(self, *args, **options):
+        if options['database_url']:
+            self._use_database(options['database_url'])
+
+        overrides = {
+            key: options[key] for key in ('description_length', 'duplicate_ratio', 'invalid_ratio', 'aliases', 'encoding')
+            if options[key] is not None
+        }
+        scenarios = options['scenario'] or list(benchmark.SCENARIOS)
+        work_dir = options['work_dir'] or tempfile.mkdtemp(prefix='import-benchmark-')
+        os.makedirs(work_dir, exist_ok=True)
+
+        # Rejects files stay out of MEDIA_ROOT, and progress out of Redis:
+        # only the import itself is measured
+        isolated = override_settings(
+            MEDIA_ROOT=work_dir,
+            IMPORT_COUNTERS_REDIS_URL=None,
+            CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+        )
+        try:
+            old_name = self._create_test_db(work_dir)
+            try:
+                with isolated:
+                    results = self._run(scenarios, overrides, work_dir, options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+        finally:
+            if not options['keep_files']:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        regressions = self._report(results, options)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'environment': self._environment(), 'results': results}, f, indent=2)
+                f.write('\n')
+
+        if options['save_baseline']:
+            baselines = benchmark.load_baselines(options['baseline'])
+            baselines.update(results)
+            benchmark.save_baselines(options['baseline'], baselines)
+            self.stdout.write(f"Baseline saved to {options['baseline']}")
+
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f"{len(regressions)} benchmark(s) regressed")
+
+    def _use_database(self, url):
+        """Point the default connection at ``url`` for the rest of the command"""
+        import dj_database_url
+
+        connections['default'].close()
+        connections.settings['default'] = connections.configure_settings(
+            {'default': dj_database_url.parse(url)}
+        )['default']
+        del connections['default']
+
+    def _create_test_db(self, work_dir):
+        # SQLite test databases default to memory; use a file, like the real one
+        if connection.vendor == 'sqlite' and not connection.settings_dict['TEST']['NAME']:
+            connection.settings_dict['TEST']['NAME'] = os.path.join(work_dir, 'benchmark.sqlite3')
+        return connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+    def _run(self, scenarios, overrides, work_dir, options):
+        results = {}
+        for scenario in scenarios:
+            spec = {**benchmark.SCENARIOS[scenario], **overrides}
+            path = os.path.join(work_dir, f'{scenario}.csv')
+            self.stdout.write(f"Generating {options['rows']:,} rows of '{scenario}' {spec}")
+            expected = benchmark.generate_catalog(path, options['rows'], seed=options['seed'], **spec)
+
+            Product.objects.all().delete()
+            for run in ('insert', 'reimport'):
+                result = benchmark.run_import(path, options['rows'], reader_engine=options['reader'])
+                mismatches = benchmark.check_counts(result, expected)
+                if mismatches:
+                    raise CommandError(f"'{scenario}' {run} imported wrong counts: {'; '.join(mismatches)}")
+                key = f"{result['vendor']}/{result['reader']}/{scenario}/{run}/{options['rows']}"
+                results[key] = result
+        return results
+
+    def _report(self, results, options):
+        baselines = benchmark.load_baselines(options['baseline'])
+        regressions = []
+
+        self.stdout.write('')
+        for key, result in results.items():
+            line = (
+                f"{key}: {result['rows_per_sec']:>9,} rows/sec, {result['seconds']:.2f}s, "
+                f"peak {result['peak_memory'] / 2 ** 20:.0f} MiB, chunks {result['chunk_sizes']}"
+            )
+            baseline = baselines.get(key)
+            if baseline:
+                change = result['rows_per_sec'] / baseline['rows_per_sec'] - 1 if baseline['rows_per_sec'] else 0
+                line += f" ({change:+.0%} vs baseline)"
+            self.stdout.write(line)
+
+            for name, phase in result['phases'].items():
+                # Phases shorter than the sampling interval may have no sample
+                peak = f"{phase['peak_memory'] / 2 ** 20:.0f} MiB" if phase['peak_memory'] else '-'
+                self.stdout.write(
+                    f"    {name:<16}{phase['seconds']:>8.2f}s {phase['rows_per_sec']:>11,} rows/sec peak {peak:>8}"
+                )
+
+            if baseline:
+                for regression in benchmark.compare(result, baseline, options['tolerance']):
+                    regressions.append(f"{key}: {regression}")
+
+        for regression in regressions:
+            self.stdout.write(self.style.ERROR(f"Regression in {regression}"))
+        if not regressions and baselines:
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
+        return regressions
+
+    def _environment(self):
+        return {
+            'timestamp': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'vendor': connection.vendor,
+        }
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0005_alter_importbatch_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='created_records',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='unchanged_records',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='updated_records',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0006_importbatch_change_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, help_text='SHA-256 of the uploaded file', max_length=64),
+        ),
+    ]
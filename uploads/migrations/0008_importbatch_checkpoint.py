@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0007_importbatch_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='checkpoint_chunk',
+            field=models.IntegerField(default=0, help_text='Chunks committed so far'),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='checkpoint_offset',
+            field=models.BigIntegerField(default=0, help_text='Byte offset after the last committed chunk'),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='file_path',
+            field=models.CharField(blank=True, help_text='Uploaded file kept until the import completes', max_length=500),
+        ),
+    ]
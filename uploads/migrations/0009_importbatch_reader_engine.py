@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0008_importbatch_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='reader_engine',
+            field=models.CharField(blank=True, choices=[('pandas', 'pandas'), ('arrow', 'Arrow')], help_text='CSV parser for this batch; blank uses IMPORT_READER_ENGINE', max_length=20),
+        ),
+    ]
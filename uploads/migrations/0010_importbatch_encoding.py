@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0009_importbatch_reader_engine'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='encoding',
+            field=models.CharField(blank=True, help_text='Detected text encoding; blank until detected', max_length=50),
+        ),
+    ]
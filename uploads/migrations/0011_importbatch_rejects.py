@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0010_importbatch_encoding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='rejects_file',
+            field=models.CharField(blank=True, help_text='CSV of rejected rows, if any', max_length=500),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='rejects_sample',
+            field=models.JSONField(blank=True, default=list, help_text='First rejected rows, capped by IMPORT_REJECTS_SAMPLE_SIZE'),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='rejects_size',
+            field=models.BigIntegerField(default=0, help_text='Bytes of the rejects file covered by the last checkpoint'),
+        ),
+    ]
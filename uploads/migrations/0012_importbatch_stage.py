@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0011_importbatch_rejects'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='stage',
+            field=models.CharField(blank=True, choices=[('preparing', 'Preparing'), ('importing', 'Importing'), ('merging', 'Merging results')], help_text='Step within processing', max_length=20),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-17 05:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0012_importbatch_stage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='dispatched_at',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='When the scheduler started this import; cleared once it finishes', null=True),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='lane',
+            field=models.CharField(blank=True, choices=[('fast', 'Fast'), ('bulk', 'Bulk')], help_text='Scheduler lane, by file size', max_length=10),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-17 05:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0013_importbatch_scheduler'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='dropped_indexes',
+            field=models.JSONField(blank=True, default=list, help_text='Secondary indexes dropped by a bulk load and not yet rebuilt'),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='phase_seconds',
+            field=models.JSONField(blank=True, default=dict, help_text='Wall-clock seconds per import phase'),
+        ),
+        migrations.AlterField(
+            model_name='importbatch',
+            name='stage',
+            field=models.CharField(blank=True, choices=[('preparing', 'Preparing'), ('importing', 'Importing'), ('merging', 'Merging results'), ('indexing', 'Rebuilding indexes')], help_text='Step within processing', max_length=20),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-17 05:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0014_importbatch_bulk_load'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='chunk_sizes',
+            field=models.JSONField(blank=True, default=list, help_text='Rows per chunk, each size the import adapted to'),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='peak_memory',
+            field=models.BigIntegerField(default=0, help_text='Peak worker RSS during the import, in bytes'),
+        ),
+    ]
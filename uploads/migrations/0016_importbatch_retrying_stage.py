@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 05:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0015_importbatch_chunking'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='importbatch',
+            name='stage',
+            field=models.CharField(blank=True, choices=[('preparing', 'Preparing'), ('importing', 'Importing'), ('merging', 'Merging results'), ('indexing', 'Rebuilding indexes'), ('retrying', 'Retrying after an error')], help_text='Step within processing', max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 06:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0016_importbatch_retrying_stage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='attempts',
+            field=models.IntegerField(default=0, help_text='Times the import task started since the batch was submitted'),
+        ),
+    ]
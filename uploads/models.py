@@ -1,9 +1,23 @@
+import os
+from datetime import timedelta
+
 from django.db import models
 
 # Create your models here.
 from django.contrib.auth.models import User
+from django.conf import settings
 from django.utils import timezone
 
+
+def slot_cutoff():
+    """Scheduler slots taken or renewed before this have expired.
+    
+    Workers are killed at ``CELERY_TASK_TIME_LIMIT``, so a slot not renewed
+    for longer than that belongs to a task that died without releasing it.
+    """
+    timeout = getattr(settings, 'IMPORT_SLOT_TIMEOUT', None) or getattr(settings, 'CELERY_TASK_TIME_LIMIT', 30 * 60)
+    return timezone.now() - timedelta(seconds=timeout)
+
 class ImportBatch(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -12,13 +26,65 @@ class ImportBatch(models.Model):
         ('failed', 'Failed'),
     ]
     
+    STAGE_CHOICES = [
+        ('preparing', 'Preparing'),
+        ('importing', 'Importing'),
+        ('merging', 'Merging results'),
+        ('indexing', 'Rebuilding indexes'),
+        ('retrying', 'Retrying after an error'),
+    ]
+    
+    LANE_CHOICES = [
+        ('fast', 'Fast'),
+        ('bulk', 'Bulk'),
+    ]
+    
+    READER_ENGINE_CHOICES = [
+        ('pandas', 'pandas'),
+        ('arrow', 'Arrow'),
+    ]
+    
     file_name = models.CharField(max_length=255, db_index=True)
     total_records = models.IntegerField()
     processed_records = models.IntegerField(default=0)
     successful_records = models.IntegerField(default=0)
     failed_records = models.IntegerField(default=0)
+    created_records = models.IntegerField(default=0)
+    updated_records = models.IntegerField(default=0)
+    unchanged_records = models.IntegerField(default=0)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES, blank=True, help_text="Step within processing")
+    lane = models.CharField(max_length=10, choices=LANE_CHOICES, blank=True, help_text="Scheduler lane, by file size")
+    dispatched_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text="When the scheduler started this import; cleared once it finishes"
+    )
+    attempts = models.IntegerField(default=0, help_text="Times the import task started since the batch was submitted")
     errors = models.JSONField(default=list, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, help_text="SHA-256 of the uploaded file")
+    reader_engine = models.CharField(
+        max_length=20,
+        choices=READER_ENGINE_CHOICES,
+        blank=True,
+        help_text="CSV parser for this batch; blank uses IMPORT_READER_ENGINE"
+    )
+    encoding = models.CharField(max_length=50, blank=True, help_text="Detected text encoding; blank until detected")
+    file_path = models.CharField(max_length=500, blank=True, help_text="Uploaded file kept until the import completes")
+    checkpoint_chunk = models.IntegerField(default=0, help_text="Chunks committed so far")
+    checkpoint_offset = models.BigIntegerField(default=0, help_text="Byte offset after the last committed chunk")
+    rejects_file = models.CharField(max_length=500, blank=True, help_text="CSV of rejected rows, if any")
+    rejects_size = models.BigIntegerField(default=0, help_text="Bytes of the rejects file covered by the last checkpoint")
+    rejects_sample = models.JSONField(default=list, blank=True, help_text="First rejected rows, capped by IMPORT_REJECTS_SAMPLE_SIZE")
+    dropped_indexes = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="Secondary indexes dropped by a bulk load and not yet rebuilt"
+    )
+    phase_seconds = models.JSONField(default=dict, blank=True, help_text="Wall-clock seconds per import phase")
+    chunk_sizes = models.JSONField(default=list, blank=True, help_text="Rows per chunk, each size the import adapted to")
+    peak_memory = models.BigIntegerField(default=0, help_text="Peak worker RSS during the import, in bytes")
     created_by = models.ForeignKey(
         User, 
         on_delete=models.SET_NULL, 
@@ -38,6 +104,49 @@ class ImportBatch(models.Model):
     def __str__(self):
         return f"{self.file_name} - {self.status}"
     
+    @property
+    def progress(self):
+        """Percent complete; total_records is an estimate until completion"""
+        if self.total_records <= 0:
+            return 0
+        return min(int((self.processed_records / self.total_records) * 100), 100)
+    
+    @property
+    def has_rejects_file(self):
+        return self.failed_records > 0 and bool(self.rejects_file) and os.path.exists(self.rejects_file)
+    
+    @property
+    def holds_slot(self):
+        """Whether the batch has a live scheduler slot; expired slots count as free"""
+        return bool(self.dispatched_at) and self.dispatched_at >= slot_cutoff()
+    
+    @property
+    def queue_position(self):
+        """1-based place in the scheduler's queue, or None if not waiting.
+        
+        Fast-lane batches are started first, so a bulk batch also waits
+        behind every queued fast one.
+        """
+        if self.status != 'pending' or self.dispatched_at:
+            # Dispatched, even if its slot has since expired
+            return None
+        waiting = ImportBatch.objects.filter(status='pending', dispatched_at__isnull=True).exclude(id=self.id)
+        if self.lane == 'bulk':
+            ahead = waiting.filter(models.Q(lane='fast') | models.Q(created_at__lt=self.created_at))
+        else:
+            ahead = waiting.filter(created_at__lt=self.created_at).exclude(lane='bulk')
+        return ahead.count() + 1
+    
+    @property
+    def can_resume(self):
+        # A batch still holding its scheduler slot has a Celery retry pending
+        return (
+            self.status == 'failed'
+            and not self.holds_slot
+            and bool(self.file_path)
+            and os.path.exists(self.file_path)
+        )
+    
     def mark_completed(self):
         self.status = 'completed'
         self.completed_at = timezone.now()
@@ -0,0 +1,105 @@
+import queue
+import threading
+from collections import deque
+
+from django.conf import settings
+
+_DONE = object()
+
+
+def pipeline_depth():
+    """Items buffered between pipeline stages; 0 runs imports sequentially"""
+    return getattr(settings, 'IMPORT_PIPELINE_DEPTH', 2)
+
+
+class Stage:
+    """Run an iterator in a background thread, ahead of its consumer.
+
+    At most ``depth`` items wait in the queue, so a slow consumer holds
+    the producer back instead of letting parsed chunks pile up in memory.
+    An exception in the producer is re-raised in the consumer. Closing
+    the stage (or leaving its ``with`` block) stops the producer and
+    waits for it, so the files it reads can be closed safely afterwards.
+
+    The producer must not touch the database: Django connections are per
+    thread, and the import's transactions belong to the consumer.
+    """
+
+    def __init__(self, iterable, depth, name='import-stage'):
+        self._iterable = iterable
+        self._queue = queue.Queue(maxsize=max(depth, 1))
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            for item in self._iterable:
+                if not self._put((item, None)):
+                    return
+            self._put((_DONE, None))
+        except BaseException as e:
+            self._put((_DONE, e))
+
+    def _put(self, entry):
+        # Wake up now and then to notice a consumer that has gone away
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __iter__(self):
+        while True:
+            item, error = self._queue.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                return
+            yield item
+
+    def close(self):
+        self._stopped.set()
+        # Unblock a producer waiting on a full queue
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def staged(stack, iterable, transform=None, depth=None):
+    """``iterable`` read ahead in a thread, then ``transform``-ed in another.
+
+    Stages are registered on the ``ExitStack`` so they are stopped before
+    anything entered on it earlier (the source files) is closed. With a
+    depth of 0 everything runs inline, in the caller's thread.
+    """
+    depth = pipeline_depth() if depth is None else depth
+    if depth <= 0:
+        return iterable if transform is None else map(transform, iterable)
+
+    items = stack.enter_context(Stage(iterable, depth, name='import-reader'))
+    if transform is not None:
+        items = stack.enter_context(Stage(map(transform, items), depth, name='import-transform'))
+    return items
+
+
+def pooled(executor, function, iterable, window):
+    """Ordered ``map`` over an executor with at most ``window`` tasks in flight"""
+    in_flight = deque()
+    for item in iterable:
+        in_flight.append(executor.submit(function, item))
+        if len(in_flight) >= window:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
@@ -0,0 +1,307 @@
+import hashlib
+import json
+import logging
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+COUNTER_NAMES = ('processed', 'successful', 'failed', 'created', 'updated', 'unchanged')
+TERMINAL_STATUSES = ('completed', 'failed')
+
+_redis_client = None
+_redis_retry_at = 0.0  # Monotonic time before which Redis is assumed down
+
+
+def progress_group(batch_id):
+    return f'upload_progress_{batch_id}'
+
+
+def publish_progress(batch_id, payload):
+    """Send one progress event to the batch's WebSocket group; never raises"""
+    try:
+        if not hasattr(settings, 'CHANNEL_LAYERS'):
+            logger.debug("Channels not configured")
+            return
+        channel_layer = get_channel_layer()
+        if not channel_layer:
+            logger.warning("Channel layer not available")
+            return
+        async_to_sync(channel_layer.group_send)(
+            progress_group(batch_id),
+            {'type': 'progress_update', 'batch_id': str(batch_id), **payload}
+        )
+    except Exception as e:
+        logger.error(f"Progress update failed: {e}")
+
+
+def get_redis():
+    """Shared client for hot counters, or None when disabled or recently unreachable"""
+    global _redis_client
+    url = getattr(settings, 'IMPORT_COUNTERS_REDIS_URL', None)
+    if not url or time.monotonic() < _redis_retry_at:
+        return None
+    if _redis_client is None:
+        import redis
+        _redis_client = redis.Redis.from_url(
+            url, decode_responses=True, socket_timeout=1, socket_connect_timeout=1
+        )
+    return _redis_client
+
+
+def redis_failed(error, batch_id):
+    """Back off for a while so a Redis outage doesn't cost a timeout per chunk"""
+    global _redis_retry_at
+    _redis_retry_at = time.monotonic() + 30
+    logger.warning(f"Hot counters unavailable for batch {batch_id}, using the database: {error}")
+
+
+class HotCounters:
+    """Live progress of one import in a Redis hash.
+
+    Workers write here after every chunk (parallel ranges with atomic
+    HINCRBY) and readers poll it instead of the database, which only sees
+    the periodic checkpoint and the final write. Every method degrades to a
+    no-op returning None if Redis is disabled or unreachable, and readers
+    then fall back to ``ImportBatch``.
+    """
+
+    def __init__(self, batch_id):
+        self.batch_id = batch_id
+        self.key = f'import:progress:{batch_id}'
+        self.ttl = getattr(settings, 'IMPORT_COUNTERS_TTL', 24 * 60 * 60)
+
+    def _run(self, build):
+        client = get_redis()
+        if client is None:
+            return None
+        try:
+            pipeline = client.pipeline()
+            build(pipeline)
+            pipeline.expire(self.key, self.ttl)
+            return pipeline.execute()
+        except Exception as e:
+            redis_failed(e, self.batch_id)
+            return None
+
+    def reset(self, **values):
+        """Start over with ``values``, dropping anything left by an earlier run"""
+        return self._run(lambda pipeline: (
+            pipeline.delete(self.key),
+            pipeline.hset(self.key, mapping=self._encode(values))
+        ))
+
+    def set(self, **values):
+        return self._run(lambda pipeline: pipeline.hset(self.key, mapping=self._encode(values)))
+
+    def increment(self, **deltas):
+        """Atomically add ``deltas``; returns the new totals, or None"""
+        names = list(deltas)
+        result = self._run(lambda pipeline: [pipeline.hincrby(self.key, name, deltas[name]) for name in names])
+        if result is None:
+            return None
+        return dict(zip(names, result))
+
+    def snapshot(self):
+        """Decoded hash contents, or None if there is no live progress"""
+        client = get_redis()
+        if client is None:
+            return None
+        try:
+            values = client.hgetall(self.key)
+        except Exception as e:
+            redis_failed(e, self.batch_id)
+            return None
+        if not values:
+            return None
+
+        snapshot = {'batch_id': self.batch_id}
+        for name, value in values.items():
+            if name in COUNTER_NAMES or name in ('total', 'progress', 'rows_per_sec'):
+                snapshot[name] = int(value)
+            elif name == 'eta_seconds':
+                snapshot[name] = int(value) if value else None
+            else:
+                snapshot[name] = value
+        total = snapshot.get('total', 0)
+        snapshot['progress'] = min(int(snapshot.get('processed', 0) / total * 100), 100) if total > 0 else 0
+        return snapshot
+
+    @staticmethod
+    def _encode(values):
+        return {name: '' if value is None else value for name, value in values.items()}
+
+
+class ProgressPublisher:
+    """Throttled, coalesced progress for one import.
+
+    The processor reports after every chunk; this decides what leaves the
+    worker. Hot counters are written on every report. Channel-layer events
+    go out at most once per ``IMPORT_PROGRESS_PUBLISH_INTERVAL`` seconds,
+    and only when something changed. Database checkpoints are due once per
+    ``IMPORT_PROGRESS_SAVE_INTERVAL`` seconds. Stage changes and terminal
+    states always go out immediately.
+    """
+
+    def __init__(self, batch_id, total, processed=0, publish_interval=None, save_interval=None):
+        self.batch_id = batch_id
+        self.total = total
+        self.publish_interval = (
+            publish_interval if publish_interval is not None
+            else getattr(settings, 'IMPORT_PROGRESS_PUBLISH_INTERVAL', 0.5)
+        )
+        self.save_interval = (
+            save_interval if save_interval is not None
+            else getattr(settings, 'IMPORT_PROGRESS_SAVE_INTERVAL', 5.0)
+        )
+        self.stage = None
+        self.status = 'processing'
+        self.counts = {'processed': processed, 'successful': 0, 'failed': 0}
+        self.counters = HotCounters(batch_id)
+
+        # Throughput is measured over this run only, not a resumed batch's history
+        self._start_processed = processed
+        self._start_time = time.monotonic()
+        self._last_publish = float('-inf')
+        self._last_save = time.monotonic()
+        self._last_sent = None
+
+    @property
+    def rows_per_second(self):
+        elapsed = time.monotonic() - self._start_time
+        done = self.counts['processed'] - self._start_processed
+        return done / elapsed if elapsed > 0 and done > 0 else 0.0
+
+    @property
+    def eta_seconds(self):
+        rate = self.rows_per_second
+        if not rate:
+            return None
+        return max(self.total - self.counts['processed'], 0) / rate
+
+    def start(self, stage, **counts):
+        """Reset the hot counters for a (re)started run and enter ``stage``"""
+        self.counts.update(counts)
+        self.counters.reset(**self.payload(stage=stage))
+        self.set_stage(stage)
+
+    def set_stage(self, stage):
+        """Enter a new stage; always published"""
+        if stage == self.stage:
+            return
+        self.stage = stage
+        if stage == 'importing':
+            self._start_time = time.monotonic()
+        self.counters.set(stage=stage, status=self.status)
+        self.publish(force=True)
+
+    def update(self, **counts):
+        """Record the latest counters and publish if the throttle allows"""
+        self.counts.update(counts)
+        self.counters.set(**self.payload())
+        self.publish()
+
+    def increment(self, **deltas):
+        """Add one worker's deltas to the shared hot counters.
+
+        Returns False when hot counters are unavailable, in which case the
+        caller has to publish totals from the database instead.
+        """
+        totals = self.counters.increment(**deltas)
+        if totals is None:
+            return False
+        self.counts.update(totals)
+        self.publish()
+        return True
+
+    def save_due(self):
+        """Whether the processor should write its checkpoint now"""
+        now = time.monotonic()
+        if now - self._last_save < self.save_interval:
+            return False
+        self._last_save = now
+        return True
+
+    def finish(self, status, total=None, **counts):
+        """Terminal state: completed or failed"""
+        if total is not None:
+            self.total = total
+        self.counts.update(counts)
+        self.stage = status
+        self.status = status
+        # Final authoritative values; the database has them too by now
+        self.counters.set(**self.payload())
+        self.publish(force=True)
+
+    def payload(self, stage=None):
+        eta = self.eta_seconds
+        return {
+            'status': self.status,
+            'stage': stage or self.stage,
+            **self.counts,
+            'total': self.total,
+            'progress': min(int(self.counts['processed'] / self.total * 100), 100) if self.total > 0 else 0,
+            'rows_per_sec': round(self.rows_per_second),
+            'eta_seconds': round(eta) if eta is not None else None,
+        }
+
+    def publish(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_publish < self.publish_interval:
+            return
+
+        snapshot = (self.stage, self.status, tuple(sorted(self.counts.items())), self.total)
+        if not force and snapshot == self._last_sent:
+            return
+
+        publish_progress(self.batch_id, self.payload())
+        self._last_publish = now
+        self._last_sent = snapshot
+
+
+def batch_progress_snapshot(batch_id):
+    """Progress of a batch for pollers: hot counters, else a briefly cached DB read.
+
+    Queued batches are always read from the database, which knows their
+    place in the scheduler's queue. Returns None if the batch does not exist.
+    """
+    snapshot = HotCounters(batch_id).snapshot()
+    if snapshot and snapshot.get('status') != 'pending':
+        return snapshot
+
+    cache_key = f'import:snapshot:{batch_id}'
+    snapshot = cache.get(cache_key)
+    if snapshot is None:
+        from uploads.models import ImportBatch
+
+        try:
+            batch = ImportBatch.objects.get(id=batch_id)
+        except ImportBatch.DoesNotExist:
+            return None
+        snapshot = {
+            'batch_id': batch.id,
+            'status': batch.status,
+            'stage': batch.stage,
+            'processed': batch.processed_records,
+            'total': batch.total_records,
+            'successful': batch.successful_records,
+            'failed': batch.failed_records,
+            'created': batch.created_records,
+            'updated': batch.updated_records,
+            'unchanged': batch.unchanged_records,
+            'progress': batch.progress,
+            'lane': batch.lane,
+            'queue_position': batch.queue_position
+        }
+        cache.set(cache_key, snapshot, getattr(settings, 'IMPORT_STATUS_CACHE_SECONDS', 1))
+    return snapshot
+
+
+def snapshot_etag(snapshot):
+    """Strong ETag for a progress snapshot; unchanged progress revalidates as 304"""
+    digest = hashlib.md5(json.dumps(snapshot, sort_keys=True).encode(), usedforsecurity=False)
+    return f'"{digest.hexdigest()}"'
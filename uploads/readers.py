@@ -0,0 +1,245 @@
+import logging
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class PandasCSVReader:
+    """pandas C parser, ``chunk_size`` rows per chunk"""
+
+    name = 'pandas'
+
+    def __init__(self, usecols, chunk_size):
+        self.usecols = usecols
+        self.chunk_size = chunk_size
+
+    def read_chunks(self, source, names=None, row_offset=0):
+        reader = pd.read_csv(
+            source,
+            chunksize=self.chunk_size,
+            dtype={column: 'string' for column in self.usecols},
+            low_memory=False,
+            usecols=self.usecols,
+            header=None if names else 'infer',
+            names=names
+        )
+        while True:
+            # chunk_size is re-read per chunk, so it can be adapted mid-file
+            try:
+                chunk = reader.get_chunk(self.chunk_size)
+            except StopIteration:
+                return
+            # Keep row numbers file-relative when reading a byte range
+            if row_offset:
+                chunk.index += row_offset
+            yield chunk
+
+
+def skip_blank_rows(row):
+    """Arrow invalid-row handler: skip whitespace-only lines, as pandas does"""
+    return 'skip' if not row.text.strip() else 'error'
+
+
+class ArrowCSVReader:
+    """Multi-threaded Arrow streaming parser.
+
+    Only the resolved columns are decoded, and they stay Arrow-backed
+    (``string[pyarrow]``) through extraction until the DB write. Unlike
+    pandas, it rejects rows with fewer fields than the header.
+    """
+
+    name = 'arrow'
+    block_size = 8 * 1024 * 1024
+
+    def __init__(self, usecols, chunk_size):
+        self.usecols = usecols
+        self.chunk_size = chunk_size
+
+    def read_chunks(self, source, names=None, row_offset=0):
+        import pyarrow as pa
+        from pyarrow import csv as pa_csv
+
+        reader = pa_csv.open_csv(
+            source,
+            read_options=pa_csv.ReadOptions(
+                use_threads=True,
+                block_size=self.block_size,
+                column_names=names
+            ),
+            # Descriptions often span lines inside quotes
+            parse_options=pa_csv.ParseOptions(newlines_in_values=True, invalid_row_handler=skip_blank_rows),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=self.usecols,
+                column_types={column: pa.string() for column in self.usecols},
+                strings_can_be_null=True
+            )
+        )
+
+        yield from self._rebatched(reader, row_offset)
+
+    def _rebatched(self, record_batches, row_offset):
+        """Frames of ``chunk_size`` rows from record batches of any size.
+
+        ``chunk_size`` is re-read per chunk, so it can be adapted mid-file.
+        """
+        import pyarrow as pa
+
+        batches = []
+        buffered = 0
+        for record_batch in record_batches:
+            batches.append(record_batch)
+            buffered += record_batch.num_rows
+            while buffered >= self.chunk_size:
+                size = self.chunk_size
+                table = pa.Table.from_batches(batches)
+                yield self._to_frame(table.slice(0, size), row_offset)
+                row_offset += size
+                batches = table.slice(size).to_batches()
+                buffered -= size
+
+        if buffered:
+            yield self._to_frame(pa.Table.from_batches(batches), row_offset)
+
+    def _to_frame(self, table, row_offset):
+        import pyarrow as pa
+
+        frame = table.to_pandas(types_mapper={pa.string(): pd.StringDtype('pyarrow')}.get)
+        frame.index = pd.RangeIndex(row_offset, row_offset + len(frame))
+        return frame
+
+
+class ParquetReader:
+    """Row-group streaming Parquet reader.
+
+    Only the resolved columns are read. Values are cast to strings so
+    extraction sees the same input as for CSV, and ``start_row`` skips
+    whole row groups before slicing into the first one needed.
+    """
+
+    name = 'parquet'
+
+    def __init__(self, usecols, chunk_size):
+        self.usecols = usecols
+        self.chunk_size = chunk_size
+
+    def read_chunks(self, source, names=None, row_offset=0, start_row=0):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(source)
+        skip = start_row
+        row_groups = []
+        for index in range(parquet.num_row_groups):
+            rows = parquet.metadata.row_group(index).num_rows
+            if not row_groups and skip >= rows:
+                skip -= rows
+                continue
+            row_groups.append(index)
+
+        if not row_groups:
+            return
+
+        def record_batches():
+            nonlocal skip
+            for record_batch in parquet.iter_batches(
+                batch_size=self.chunk_size, columns=self.usecols, row_groups=row_groups
+            ):
+                if skip:
+                    skipped = min(skip, record_batch.num_rows)
+                    record_batch = record_batch.slice(skipped)
+                    skip -= skipped
+                    if not record_batch.num_rows:
+                        continue
+                yield record_batch
+
+        yield from self._rebatched(record_batches(), row_offset)
+
+    _rebatched = ArrowCSVReader._rebatched
+
+    def _to_frame(self, table, row_offset):
+        import pyarrow as pa
+
+        table = table.cast(pa.schema([(column, pa.string()) for column in table.column_names]))
+        return ArrowCSVReader._to_frame(self, table, row_offset)
+
+
+class NDJSONReader:
+    """Newline-delimited JSON, one object per line, ``chunk_size`` lines per chunk"""
+
+    name = 'ndjson'
+
+    def __init__(self, usecols, chunk_size):
+        self.usecols = usecols
+        self.chunk_size = chunk_size
+
+    def read_chunks(self, source, names=None, row_offset=0):
+        reader = pd.read_json(
+            source,
+            lines=True,
+            chunksize=self.chunk_size,
+            dtype=False,
+            convert_dates=False
+        )
+        while True:
+            # Read per chunk, so chunk_size can be adapted mid-file
+            reader.chunksize = self.chunk_size
+            try:
+                chunk = next(reader)
+            except StopIteration:
+                return
+            # Keys missing from every object in the chunk come back as NA;
+            # convert_dtypes keeps integral SKUs as '123' rather than '123.0'
+            chunk = chunk.reindex(columns=self.usecols).convert_dtypes().astype('string')
+            chunk.index = pd.RangeIndex(row_offset, row_offset + len(chunk))
+            row_offset += len(chunk)
+            yield chunk
+
+
+READERS = {
+    PandasCSVReader.name: PandasCSVReader,
+    ArrowCSVReader.name: ArrowCSVReader,
+}
+
+# Non-CSV inputs are picked by file suffix, not by the CSV engine setting
+INPUT_FORMAT_SUFFIXES = {
+    '.parquet': 'parquet',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+}
+FORMAT_READERS = {
+    'parquet': ParquetReader,
+    'ndjson': NDJSONReader,
+}
+
+
+def input_format_for(file_name):
+    """'parquet' or 'ndjson' from the file name, otherwise 'csv'"""
+    name = str(file_name).lower()
+    for suffix, input_format in INPUT_FORMAT_SUFFIXES.items():
+        if name.endswith(suffix):
+            return input_format
+    return 'csv'
+
+
+def arrow_available():
+    try:
+        import pyarrow.csv
+    except ImportError:
+        return False
+    return True
+
+
+def get_reader(engine, usecols, chunk_size, input_format='csv'):
+    """Reader for ``engine``, falling back to pandas if pyarrow is missing.
+
+    ``engine`` only applies to CSV; other input formats have one reader each.
+    """
+    if input_format != 'csv':
+        return FORMAT_READERS[input_format](usecols, chunk_size)
+    if engine not in READERS:
+        raise ValueError(f"Unknown CSV reader engine: {engine}")
+    if engine == ArrowCSVReader.name and not arrow_available():
+        logger.warning("pyarrow is not installed, falling back to the pandas reader")
+        engine = PandasCSVReader.name
+    return READERS[engine](usecols, chunk_size)
@@ -0,0 +1,91 @@
+import os
+
+import pandas as pd
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+
+def rejects_path(batch_id, part=None):
+    """Storage path of a batch's rejects CSV, or of one parallel range's part"""
+    name = f'rejects/batch_{batch_id}.csv' if part is None else f'rejects/batch_{batch_id}.part{part}.csv'
+    path = default_storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def sample_size():
+    return getattr(settings, 'IMPORT_REJECTS_SAMPLE_SIZE', 100)
+
+
+class RejectsWriter:
+    """Spill rejected rows to a CSV on disk as the import streams.
+
+    Each row keeps its file row number, the reason and the values of the
+    columns the importer read. Only the first ``sample_size`` rejects stay
+    in memory (for ``ImportBatch.rejects_sample``); everything else is on
+    disk, so memory is bounded however many rows are rejected.
+
+    ``size`` truncates an existing file back to a checkpoint, so rejects
+    written by a chunk that never committed are not repeated on resume.
+    """
+
+    def __init__(self, path, columns, size=0, sample=None, header=True):
+        self.path = path
+        self.columns = list(columns)
+        self.sample = list(sample or [])
+        self.sample_size = sample_size()
+
+        self._file = open(path, 'a+', newline='', encoding='utf-8')
+        self._file.truncate(size)
+        self._file.seek(size)
+        if not size and header:
+            pd.DataFrame(columns=['row', 'reason'] + self.columns).to_csv(self._file, index=False)
+        self._file.flush()
+
+    @property
+    def size(self):
+        return self._file.tell()
+
+    def write(self, rejected):
+        """Append a frame of rejected rows with 'row', 'reason' and the read columns"""
+        if rejected.empty:
+            return
+        rejected = rejected[['row', 'reason'] + self.columns]
+        rejected.to_csv(self._file, index=False, header=False)
+        self._file.flush()
+
+        # Shown on the status page: first column is the primary SKU column
+        wanted = self.sample_size - len(self.sample)
+        for row, reason, sku in rejected.iloc[:max(wanted, 0), :3].itertuples(index=False, name=None):
+            self.sample.append({'row': int(row), 'sku': 'Unknown' if pd.isna(sku) else str(sku), 'error': reason})
+
+    def append_part(self, part_path, sample):
+        """Append a parallel range's headerless part file and its sample"""
+        with open(part_path, newline='', encoding='utf-8') as source:
+            for block in iter(lambda: source.read(1024 * 1024), ''):
+                self._file.write(block)
+        self._file.flush()
+        self.sample.extend(sample[:max(self.sample_size - len(self.sample), 0)])
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def merge_rejects(batch_id, columns, parts):
+    """Concatenate parallel range parts, in file order, into the batch's rejects CSV.
+
+    ``parts`` are ``(part_path, sample)`` pairs; returns the merged path,
+    its size and the combined capped sample.
+    """
+    with RejectsWriter(rejects_path(batch_id), columns) as writer:
+        for part_path, sample in parts:
+            if os.path.exists(part_path):
+                writer.append_part(part_path, sample)
+                os.remove(part_path)
+        return writer.path, writer.size, writer.sample
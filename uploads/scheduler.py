@@ -0,0 +1,138 @@
+import logging
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from uploads.models import ImportBatch, slot_cutoff
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LANE_QUEUES = {'fast': 'imports_fast', 'bulk': 'imports_bulk'}
+
+
+def lane_for(total_records):
+    """'fast' for small files, 'bulk' for anything above IMPORT_FAST_LANE_MAX_RECORDS"""
+    return 'fast' if total_records <= getattr(settings, 'IMPORT_FAST_LANE_MAX_RECORDS', 10000) else 'bulk'
+
+
+def lane_queue(lane):
+    """Celery queue a lane's tasks are sent to"""
+    return getattr(settings, 'IMPORT_LANE_QUEUES', DEFAULT_LANE_QUEUES).get(lane, 'celery')
+
+
+def lane_limits():
+    return {
+        'fast': getattr(settings, 'IMPORT_MAX_FAST_IMPORTS', 3),
+        'bulk': getattr(settings, 'IMPORT_MAX_BULK_IMPORTS', 1),
+    }
+
+
+def submit(batch):
+    """Queue a new or resumed batch and start it if a slot is free"""
+    batch.lane = lane_for(batch.total_records)
+    batch.status = 'pending'
+    batch.dispatched_at = None
+    batch.attempts = 0
+    batch.save(update_fields=['lane', 'status', 'dispatched_at', 'attempts'])
+    return dispatch()
+
+
+def release(batch_id):
+    """Free a finished import's slot and start whatever is next in line"""
+    ImportBatch.objects.filter(id=batch_id).update(dispatched_at=None)
+    return dispatch()
+
+
+def renew(batch_id):
+    """Restart the expiry clock of a batch's slot; every task of an import calls this when it starts"""
+    ImportBatch.objects.filter(id=batch_id, dispatched_at__isnull=False).update(dispatched_at=timezone.now())
+
+
+def reclaim_expired():
+    """Fail the batches whose slot expired; returns their ids.
+    
+    Their task died without releasing the slot (killed at the hard time
+    limit, or its worker lost), and Celery won't run it again. The last
+    checkpoint is kept, so they can be resumed. Call ``dispatch`` after
+    this to start what was queued behind them.
+    """
+    with transaction.atomic():
+        expired = list(ImportBatch.objects.select_for_update().filter(dispatched_at__lt=slot_cutoff()))
+        for batch in expired:
+            batch.dispatched_at = None
+            batch.status = 'failed'
+            batch.errors.append("The import stopped responding and was stopped; resume it to continue")
+            batch.save(update_fields=['dispatched_at', 'status', 'errors'])
+    
+    for batch in expired:
+        logger.warning(f"Reclaimed the expired slot of batch {batch.id}")
+    return [batch.id for batch in expired]
+
+
+def dispatch():
+    """Start queued batches until a concurrency cap is reached.
+
+    A batch holds a slot from dispatch until ``release``, including while
+    Celery waits to retry it. Slots not renewed within the task time limit
+    (see ``slot_cutoff``) are free again: their worker died without
+    releasing them. Fast-lane batches go first, then oldest
+    first. Caps apply per lane, per user (anonymous uploads share one
+    allowance) and overall; one batch blocked by a cap doesn't stop a
+    later one that fits. Queued rows are locked, so concurrent
+    dispatchers never start the same batch or overshoot a cap.
+
+    Returns the ids of the batches started.
+    """
+    from uploads.tasks import process_csv_upload
+
+    max_total = getattr(settings, 'IMPORT_MAX_CONCURRENT_IMPORTS', 4)
+    max_per_user = getattr(settings, 'IMPORT_MAX_IMPORTS_PER_USER', 2)
+    max_per_lane = lane_limits()
+
+    with transaction.atomic():
+        queued = list(
+            ImportBatch.objects.select_for_update()
+            .filter(status='pending', dispatched_at__isnull=True)
+            .order_by('created_at')
+        )
+        if not queued:
+            return []
+        queued.sort(key=lambda batch: batch.lane != 'fast')
+
+        running = list(
+            ImportBatch.objects.filter(dispatched_at__gte=slot_cutoff()).values_list('lane', 'created_by_id')
+        )
+        per_lane = Counter(lane for lane, _ in running)
+        per_user = Counter(user_id for _, user_id in running)
+        total = len(running)
+
+        started = []
+        now = timezone.now()
+        for batch in queued:
+            if total >= max_total:
+                break
+            lane = batch.lane or lane_for(batch.total_records)
+            if per_lane[lane] >= max_per_lane.get(lane, max_total):
+                continue
+            if per_user[batch.created_by_id] >= max_per_user:
+                continue
+
+            batch.lane = lane
+            batch.dispatched_at = now
+            batch.save(update_fields=['lane', 'dispatched_at'])
+            per_lane[lane] += 1
+            per_user[batch.created_by_id] += 1
+            total += 1
+            started.append(batch)
+
+        for batch in started:
+            transaction.on_commit(lambda batch=batch: process_csv_upload.apply_async(
+                (batch.id, batch.file_path, batch.created_by_id),
+                queue=lane_queue(batch.lane)
+            ))
+
+    for batch in started:
+        logger.info(f"Dispatched batch {batch.id} to the {batch.lane} lane")
+    return [batch.id for batch in started]
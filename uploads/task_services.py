@@ -1,9 +1,9 @@
 import pandas as pd
-import chardet
 import os
 import logging
 from django.core.files.storage import default_storage
 from products.models import Product
+from uploads.encoding import detect_encoding
 from uploads.models import ImportBatch
 
 logger = logging.getLogger(__name__)
@@ -11,11 +11,8 @@ logger = logging.getLogger(__name__)
 class CSVTaskService:
     
     def detect_encoding(self, file_path):
-        """Detect file encoding"""
-        with open(file_path, 'rb') as f:
-            raw_data = f.read()
-            result = chardet.detect(raw_data)
-            return result['encoding']
+        """Detect file encoding (UTF-8 fast path, bounded chardet sample)"""
+        return detect_encoding(file_path)
     
     def _map_row_to_product(self, row):
         """Map CSV row to product data"""
@@ -56,7 +53,7 @@ class CSVTaskService:
         """Create or update product, handling duplicates case-insensitively"""
         sku = product_data['sku']
         
-        existing_product = Product.objects.filter(sku__iexact=sku).first()
+        existing_product = Product.objects.by_sku(sku).first()
         
         if existing_product:
             existing_product.name = product_data['name']
@@ -1,88 +1,344 @@
 import os
 import pandas as pd
-from celery import shared_task
+from celery import chord, shared_task
 from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.models import F
 from .models import ImportBatch
 
 import logging
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
 from django.conf import settings
+from uploads.bulk_load import PhaseTimer, bulk_load_applies, drop_indexes, rebuild_indexes, restore_abandoned_indexes
 from uploads.bulk_services import UltraFastCSVProcessor
+from uploads.compression import compression_for
+from uploads.encoding import UTF8_NAMES, batch_encoding
+from uploads.readers import input_format_for
+from uploads.progress import ProgressPublisher, publish_progress
+from uploads.rejects import merge_rejects, rejects_path
+from uploads import scheduler
 
 
 logger = logging.getLogger(__name__)
 
 def send_progress_update(batch_id, status, processed, total, successful, failed):
-    """Send progress update via WebSocket"""
+    """Send an unthrottled progress update via WebSocket.
+    
+    Imports publish through ``ProgressPublisher``, which throttles and coalesces.
+    """
+    progress = min(int((processed / total) * 100), 100) if total > 0 else 0
+    logger.info(f"📤 Sending progress update: {processed}/{total} ({progress}%)")
+    publish_progress(batch_id, {
+        'status': status,
+        'processed': processed,
+        'total': total,
+        'successful': successful,
+        'failed': failed,
+        'progress': progress
+    })
+
+def release_import_slot(batch_id):
+    """Give the batch's scheduler slot to the next queued import; never raises"""
     try:
-        # Only try WebSocket if Channels is configured
-        if hasattr(settings, 'CHANNEL_LAYERS'):
-            channel_layer = get_channel_layer()
-            if channel_layer:
-                progress = int((processed / total) * 100) if total > 0 else 0
-                
-                logger.info(f"📤 Sending progress update: {processed}/{total} ({progress}%)")
-                
-                async_to_sync(channel_layer.group_send)(
-                    f'upload_progress_{batch_id}',
-                    {
-                        'type': 'progress_update',
-                        'batch_id': str(batch_id),
-                        'status': status,
-                        'processed': processed,
-                        'total': total,
-                        'successful': successful,
-                        'failed': failed,
-                        'progress': progress
-                    }
-                )
-                logger.debug(f"Progress update sent successfully")
-            else:
-                logger.warning("Channel layer not available")
-        else:
-            logger.debug("Channels not configured")
-            
+        scheduler.release(batch_id)
     except Exception as e:
-        logger.error(f"❌ Progress update failed: {e}")
+        logger.error(f"Could not release the import slot of batch {batch_id}: {e}")
 
 @shared_task(bind=True, max_retries=3)
 def process_csv_upload(self, batch_id, file_path, user_id=None):
     """Optimized task for fast CSV processing"""
     try:
         logger.info(f"Starting ultra-fast processing for batch {batch_id}")
+        scheduler.renew(batch_id)
+        if not start_attempt(batch_id):
+            return {'batch_id': batch_id, 'failed': True, 'attempts_exhausted': True}
+        
+        if use_parallel_import(batch_id, file_path):
+            result = start_parallel_import(batch_id, file_path)
+            if result:
+                return result
         
         processor = UltraFastCSVProcessor()
-        successful, failed_count, errors = processor.process_large_csv(
-            file_path, 
-            batch_id, 
-            chunk_size=50000  # Larger chunks for speed
+        # Chunk size adapts to the file's row width and write throughput
+        successful, failed_count, rejects_sample = processor.process_large_csv(
+            file_path, batch_id, retry_pending=self.request.retries < self.max_retries
         )
         
         # Clean up file after processing
         if os.path.exists(file_path):
             os.remove(file_path)
+        release_import_slot(batch_id)
         
         logger.info(f"Completed batch {batch_id}: {successful} successful, {failed_count} failed")
         return {
             'batch_id': batch_id,
             'successful': successful,
             'failed': failed_count,
-            'total_errors': len(errors)
+            'total_errors': failed_count,
+            'engine': processor.engine_name,
+            'rows_per_sec': round(processor.rows_per_second),
+            'phase_seconds': processor.timer.seconds,
+            'chunk_sizes': processor.chunk_sizer.sizes,
+            'peak_memory': processor.chunk_sizer.peak_memory
         }
         
     except Exception as e:
         logger.error(f"Task failed for batch {batch_id}: {e}")
         
-        # Clean up file on failure
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        # Keep the file: a retry or a manual resume continues from the last checkpoint
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=10 * 2 ** self.request.retries)
             
-        # Update batch status
+        # Update batch status, unless the processor already failed it
         try:
             batch = ImportBatch.objects.get(id=batch_id)
-            batch.mark_failed(str(e))
+            if batch.status != 'failed':
+                batch.mark_failed(str(e))
+                send_progress_update(
+                    batch_id, 'failed', batch.processed_records, batch.total_records,
+                    batch.successful_records, batch.failed_records
+                )
         except ImportBatch.DoesNotExist:
             pass
+        release_import_slot(batch_id)
             
         raise
+
+
+def start_attempt(batch_id):
+    """Count a start of the import task; False, with the batch failed, once there were too many.
+    
+    Late acks redeliver the task when its worker dies, which retries don't
+    count: a file that gets the worker OOM-killed would loop forever.
+    """
+    ImportBatch.objects.filter(id=batch_id).update(attempts=F('attempts') + 1)
+    batch = ImportBatch.objects.get(id=batch_id)
+    max_attempts = getattr(settings, 'IMPORT_MAX_ATTEMPTS', 5)
+    if batch.attempts <= max_attempts:
+        return True
+    
+    logger.error(f"Batch {batch_id} started {max_attempts} times without finishing, giving up")
+    batch.mark_failed(f"Gave up after {max_attempts} attempts; the worker may be running out of memory")
+    send_progress_update(
+        batch_id, 'failed', batch.processed_records, batch.total_records,
+        batch.successful_records, batch.failed_records
+    )
+    release_import_slot(batch_id)
+    return False
+
+
+def use_parallel_import(batch_id, file_path):
+    """Split across workers only for large files on PostgreSQL"""
+    workers = getattr(settings, 'IMPORT_PARALLEL_WORKERS', 1)
+    if workers < 2 or connection.vendor != 'postgresql':
+        return False
+    
+    # Compressed streams and non-CSV inputs can't be split into byte ranges
+    if compression_for(file_path) or input_format_for(file_path) != 'csv':
+        return False
+    
+    # A checkpointed serial import resumes serially
+    batch = ImportBatch.objects.get(id=batch_id)
+    if batch.checkpoint_offset or batch.total_records < getattr(settings, 'IMPORT_PARALLEL_MIN_RECORDS', 100000):
+        return False
+    
+    # Byte ranges are read without transcoding
+    return batch_encoding(batch, file_path) in UTF8_NAMES
+
+def start_parallel_import(batch_id, file_path):
+    """Fan record-aligned byte ranges out as a chord with a completion callback.
+    
+    Returns None, having started nothing, if the file can't be split.
+    """
+    processor = UltraFastCSVProcessor()
+    header = processor.read_header(file_path)
+    ranges = processor.split_byte_ranges(file_path, settings.IMPORT_PARALLEL_WORKERS)
+    if len(ranges) < 2:
+        logger.info(f"Batch {batch_id} has no safe split points, importing serially")
+        return None
+    
+    # Ranges only stage their rows; the chord callback merges them in one statement
+    processor.open_staging(batch_id)
+    
+    ImportBatch.objects.filter(id=batch_id).update(
+        status='processing',
+        stage='importing',
+        processed_records=0,
+        successful_records=0,
+        failed_records=0,
+        created_records=0,
+        updated_records=0,
+        unchanged_records=0,
+        rejects_file='',
+        rejects_size=0,
+        rejects_sample=[]
+    )
+    
+    batch = ImportBatch.objects.get(id=batch_id)
+    total_records, lane = batch.total_records, batch.lane
+    
+    # Indexes dropped here are rebuilt by the chord callback, or its error callback
+    timer = PhaseTimer()
+    restore_abandoned_indexes(exclude_batch_id=batch_id)
+    if batch.dropped_indexes or bulk_load_applies(total_records):
+        drop_indexes(batch, timer)
+    batch.phase_seconds = timer.seconds
+    batch.save(update_fields=['phase_seconds'])
+    
+    ProgressPublisher(batch_id, total_records).start(
+        'importing', **dict.fromkeys(['processed', 'successful', 'failed', 'created', 'updated', 'unchanged'], 0)
+    )
+    
+    callback = finalize_parallel_import.s(batch_id, file_path).on_error(
+        parallel_import_failed.s(batch_id, file_path)
+    )
+    # Ranges stay in the batch's lane so they never hold up fast-lane imports
+    queue = scheduler.lane_queue(lane or 'bulk')
+    chord(
+        process_csv_range.s(batch_id, file_path, start, end, header, first_row).set(queue=queue)
+        for start, end, first_row in ranges
+    )(callback.set(queue=queue))
+    
+    logger.info(f"Batch {batch_id} split into {len(ranges)} parallel ranges")
+    return {
+        'batch_id': batch_id,
+        'parallel': True,
+        'ranges': len(ranges)
+    }
+
+@shared_task
+def process_csv_range(batch_id, file_path, start, end, header, first_row):
+    """Import one byte range of a file; counters are added to the shared batch"""
+    scheduler.renew(batch_id)
+    processor = UltraFastCSVProcessor()
+    with processor.timer.phase('load'):
+        successful, failed_count, rejects_sample = processor.process_byte_range(
+            file_path, batch_id, start, end, header, first_row
+        )
+    return {
+        'successful': successful,
+        'failed': failed_count,
+        'seconds': processor.timer.seconds['load'],
+        'rows_per_sec': round(processor.rows_per_second),
+        'rejects_part': rejects_path(batch_id, part=start),
+        'rejects_sample': rejects_sample,
+        'rejects_columns': processor.read_columns,
+        'chunk_sizes': processor.chunk_sizer.sizes,
+        'peak_memory': processor.chunk_sizer.peak_memory
+    }
+
+@shared_task
+def finalize_parallel_import(results, batch_id, file_path):
+    """Chord callback once every range has been imported"""
+    scheduler.renew(batch_id)
+    batch = ImportBatch.objects.get(id=batch_id)
+    batch.total_records = batch.processed_records
+    batch.stage = 'merging'
+    batch.save(update_fields=['stage'])
+    progress = ProgressPublisher(batch_id, batch.total_records, processed=batch.processed_records)
+    progress.set_stage('merging')
+    
+    # Chord results are in range order, so the merged rejects keep file order
+    successful = sum(result['successful'] for result in results)
+    failed_count = sum(result['failed'] for result in results)
+    parts = [(result['rejects_part'], result['rejects_sample']) for result in results]
+    if failed_count:
+        batch.rejects_file, batch.rejects_size, batch.rejects_sample = merge_rejects(
+            batch_id, results[0]['rejects_columns'], parts
+        )
+    else:
+        for part_path, _ in parts:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+    
+    # Ranges run side by side, so the load took as long as the slowest one
+    timer = PhaseTimer(batch.phase_seconds)
+    timer.add('load', max(result['seconds'] for result in results))
+    
+    # Every range's rows, last row wins for a SKU repeated anywhere in the file
+    processor = UltraFastCSVProcessor()
+    processor.open_staging(batch_id, truncate=False)
+    with timer.phase('merge'):
+        counts = processor.merge_staging(staged_rows=batch.successful_records)
+    processor.drop_staging()
+    batch.created_records = counts['created']
+    batch.updated_records = counts['updated']
+    batch.unchanged_records = counts['unchanged']
+    if batch.dropped_indexes:
+        batch.stage = 'indexing'
+        batch.save(update_fields=['stage'])
+        progress.set_stage('indexing')
+        rebuild_indexes(batch, timer)
+    batch.phase_seconds = timer.seconds
+    # Each range ran in its own worker and adapted its own chunk size
+    batch.chunk_sizes = [size for result in results for size in result['chunk_sizes']]
+    batch.peak_memory = max(result['peak_memory'] for result in results)
+    batch.mark_completed()
+    progress.finish(
+        'completed',
+        processed=batch.processed_records,
+        successful=batch.successful_records,
+        failed=batch.failed_records,
+        created=batch.created_records,
+        updated=batch.updated_records,
+        unchanged=batch.unchanged_records
+    )
+    
+    if os.path.exists(file_path):
+        os.remove(file_path)
+    release_import_slot(batch_id)
+    
+    logger.info(
+        f"Completed parallel batch {batch_id}: {successful} successful, {failed_count} failed "
+        f"({timer})"
+    )
+    return {
+        'batch_id': batch_id,
+        'successful': successful,
+        'failed': failed_count,
+        'rows_per_sec': sum(result['rows_per_sec'] for result in results),
+        'phase_seconds': timer.seconds
+    }
+
+@shared_task
+def parallel_import_failed(request, exc, traceback, batch_id, file_path):
+    """Chord error callback: any failed range fails the batch.
+    
+    The file is kept so the batch can be resumed; ranges don't checkpoint, so
+    a resume re-imports the whole file (the upsert makes that safe). Ranges
+    only stage rows, so a failed parallel import leaves products untouched.
+    """
+    logger.error(f"Parallel import failed for batch {batch_id}: {exc}")
+    
+    try:
+        batch = ImportBatch.objects.get(id=batch_id)
+        timer = PhaseTimer(batch.phase_seconds)
+        try:
+            rebuild_indexes(batch, timer)
+        except Exception as e:
+            # Left recorded on the batch; the next import restores them
+            logger.error(f"Could not rebuild indexes for batch {batch_id}: {e}")
+        batch.phase_seconds = timer.seconds
+        batch.mark_failed(str(exc))
+        UltraFastCSVProcessor().drop_staging(batch_id)
+        ProgressPublisher(batch_id, batch.total_records).finish(
+            'failed',
+            processed=batch.processed_records,
+            successful=batch.successful_records,
+            failed=batch.failed_records,
+            created=batch.created_records,
+            updated=batch.updated_records,
+            unchanged=batch.unchanged_records
+        )
+    except ImportBatch.DoesNotExist:
+        pass
+    release_import_slot(batch_id)
+
+@shared_task
+def reclaim_import_slots():
+    """Periodic (Celery beat): fail imports whose slot expired, then start queued ones"""
+    for batch in ImportBatch.objects.filter(id__in=scheduler.reclaim_expired()):
+        send_progress_update(
+            batch.id, 'failed', batch.processed_records, batch.total_records,
+            batch.successful_records, batch.failed_records
+        )
+    return scheduler.dispatch()
@@ -1,3 +1,607 @@
-from django.test import TestCase
+import csv
+import gzip
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import pandas as pd
+
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.contrib.messages import get_messages
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+
+from products.models import Product
+from uploads import progress
+from uploads.bulk_services import RecordOffsetTracker, UltraFastCSVProcessor
+from uploads.chunking import ChunkSizer, chunks_in_flight
+from uploads.compression import IncrementalDecompressor
+from uploads.encoding import EncodingDetector, TranscodingStream, open_text_stream
+from uploads.models import ImportBatch
+from uploads.readers import ArrowCSVReader
+from uploads.transform import (
+    MAX_SKU_LENGTH, decode_transformed, to_arrow_buffer, transform_arrow_chunk, transform_chunk
+)
+
+
+def write_multiline_catalog(path, rows):
+    """CSV where every 7th row has a description spanning two lines"""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['sku', 'name', 'description'])
+        for i in range(rows):
+            description = f'line one of {i}\nline two of {i}' if i % 7 == 0 else f'plain {i}'
+            writer.writerow([f'SKU-{i:06d}', f'Product {i}', description])
+
+
+class RecordOffsetTrackerTests(TransactionTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'catalog.csv')
+
+    def first_record_at(self, offset):
+        """First record from ``offset`` on, skipping blank lines as the parsers do"""
+        with open(self.path, newline='') as f:
+            f.seek(offset)
+            return next(row for row in csv.reader(f) if ''.join(row).strip())
+
+    def test_offsets_land_on_records_across_quoted_newlines(self):
+        write_multiline_catalog(self.path, 100)
+        for consumed in (1, 7, 8, 13, 50, 99):
+            with RecordOffsetTracker(self.path) as tracker:
+                offset = tracker.advance(consumed)
+            self.assertEqual(self.first_record_at(offset)[0], f'SKU-{consumed:06d}')
+
+    def test_blank_lines_are_not_records(self):
+        with open(self.path, 'w', newline='') as f:
+            f.write('sku,name\r\nA,"x\r\n\r\ny"\r\n\r\n   \r\nB,b\n\nC,c\n')
+        with RecordOffsetTracker(self.path) as tracker:
+            self.assertEqual(self.first_record_at(tracker.advance(1)), ['B', 'b'])
+            self.assertEqual(self.first_record_at(tracker.advance(1)), ['C', 'c'])
+
+    def test_byte_ranges_start_on_records(self):
+        write_multiline_catalog(self.path, 1000)
+        ranges = UltraFastCSVProcessor().split_byte_ranges(self.path, 4)
+        self.assertEqual(len(ranges), 4)
+        self.assertEqual(ranges[-1][1], os.path.getsize(self.path))
+        for (start, end, first_row), following in zip(ranges, ranges[1:] + [None]):
+            self.assertEqual(self.first_record_at(start)[0], f'SKU-{first_row:06d}')
+            if following:
+                self.assertEqual(end, following[0])
+
+    def test_unbalanced_quotes_are_not_split(self):
+        with open(self.path, 'w', newline='') as f:
+            f.write('sku,name\n' + 'A,"open\n' + 'B,b\n' * 1000)
+        self.assertEqual(len(UltraFastCSVProcessor().split_byte_ranges(self.path, 4)), 1)
+
+    def test_small_reads_carry_quote_state_between_blocks(self):
+        write_multiline_catalog(self.path, 50)
+        with RecordOffsetTracker(self.path) as tracker:
+            tracker._file.read = lambda size, read=tracker._file.read: read(5)
+            offsets = [tracker.advance(1) for _ in range(49)]
+        self.assertEqual(self.first_record_at(offsets[-1])[0], 'SKU-000049')
+
+
+# Imports in tests: no Redis, in-memory progress events, a checkpoint per chunk
+import_settings = override_settings(
+    IMPORT_COUNTERS_REDIS_URL=None,
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    IMPORT_PROGRESS_SAVE_INTERVAL=0,
+    IMPORT_ADAPTIVE_CHUNKS=False,
+)
+
+
+@import_settings
+class ResumeTests(TransactionTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        media = override_settings(MEDIA_ROOT=self.directory)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.path = os.path.join(self.directory, 'catalog.csv')
+
+    def assert_resumes_multiline_file(self, reader_engine):
+        write_multiline_catalog(self.path, 30001)
+        batch = ImportBatch.objects.create(file_name='catalog.csv', total_records=30001, file_path=self.path)
+
+        processor = UltraFastCSVProcessor(reader_engine=reader_engine)
+        write_records = processor._write_records
+        calls = []
+
+        def fail_third_chunk(records):
+            calls.append(len(records))
+            if len(calls) == 3:
+                raise RuntimeError("database went away")
+            return write_records(records)
+
+        processor._write_records = fail_third_chunk
+        with self.assertRaises(RuntimeError):
+            processor.process_large_csv(self.path, batch.id, chunk_size=5000)
+        batch.refresh_from_db()
+        self.assertEqual(batch.processed_records, 10000)
+
+        UltraFastCSVProcessor(reader_engine=reader_engine).process_large_csv(self.path, batch.id, chunk_size=5000)
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, 'completed')
+        self.assertEqual(batch.total_records, 30001)
+        self.assertEqual(batch.processed_records, 30001)
+        self.assertEqual(batch.successful_records, 30001)
+        self.assertEqual(batch.failed_records, 0)
+        self.assertEqual(Product.objects.count(), 30001)
+        self.assertFalse(Product.objects.filter(sku__startswith='LINE').exists())
+        self.assertEqual(Product.objects.get(sku='SKU-000014').description, 'line one of 14\nline two of 14')
+
+    def test_failure_with_a_retry_pending_is_not_final(self):
+        write_multiline_catalog(self.path, 100)
+        batch = ImportBatch.objects.create(file_name='catalog.csv', total_records=100, file_path=self.path)
+
+        for retry_pending, status, stage in ((True, 'processing', 'retrying'), (False, 'failed', 'importing')):
+            processor = UltraFastCSVProcessor()
+            processor._write_records = mock.Mock(side_effect=RuntimeError("database went away"))
+            with self.assertRaises(RuntimeError):
+                processor.process_large_csv(self.path, batch.id, retry_pending=retry_pending)
+            batch.refresh_from_db()
+            self.assertEqual((batch.status, batch.stage), (status, stage))
+        self.assertEqual(batch.errors, ["database went away"] * 2)
+
+    @override_settings(IMPORT_MAX_ATTEMPTS=2)
+    def test_redelivered_imports_give_up_after_max_attempts(self):
+        from uploads import scheduler
+        from uploads.tasks import process_csv_upload
+
+        dispatched = mock.patch.object(process_csv_upload, 'apply_async')
+        dispatched.start()
+        self.addCleanup(dispatched.stop)
+        write_multiline_catalog(self.path, 10)
+        batch = ImportBatch.objects.create(file_name='catalog.csv', total_records=10, file_path=self.path)
+        scheduler.submit(batch)
+        # As if the worker died mid-import each time and the message was redelivered
+        with mock.patch.object(UltraFastCSVProcessor, 'process_large_csv', side_effect=SystemExit):
+            for _ in range(2):
+                with self.assertRaises(SystemExit):
+                    process_csv_upload.apply(args=(batch.id, self.path), throw=True)
+
+        result = process_csv_upload.apply(args=(batch.id, self.path)).get()
+        self.assertTrue(result['attempts_exhausted'])
+        batch.refresh_from_db()
+        self.assertEqual((batch.status, batch.attempts, batch.dispatched_at), ('failed', 3, None))
+        self.assertTrue(batch.can_resume)
+
+        scheduler.submit(batch)
+        batch.refresh_from_db()
+        self.assertEqual(batch.attempts, 0)
+
+    def test_resume_after_failure_mid_multiline_file(self):
+        self.assert_resumes_multiline_file('pandas')
+
+    def test_arrow_reader_resumes_multiline_file(self):
+        # Small blocks, so block boundaries fall inside quoted descriptions
+        with mock.patch.object(ArrowCSVReader, 'block_size', 64 * 1024):
+            self.assert_resumes_multiline_file('arrow')
+
+
+class TransformTests(SimpleTestCase):
+    column_map = {'sku': ['sku'], 'name': [], 'description': []}
+
+    def chunk(self, dtype, **columns):
+        return pd.DataFrame({name: pd.array(values, dtype=dtype) for name, values in columns.items()})
+
+    def test_missing_name_and_description_columns(self):
+        for dtype in ('string', 'string[pyarrow]'):
+            chunk = self.chunk(dtype, sku=['a1', ' ', 'b2'])
+            rows, records, rejected = transform_chunk(chunk, self.column_map, ['sku'], 2)
+            self.assertEqual(rows, 3)
+            self.assertEqual(records.to_dict('records'), [
+                {'sku': 'A1', 'name': 'Product A1', 'description': ''},
+                {'sku': 'B2', 'name': 'Product B2', 'description': ''},
+            ])
+            self.assertEqual(list(rejected['row']), [3])
+
+    def test_process_pool_round_trip_without_optional_columns(self):
+        # The pool hands chunks over as Arrow buffers, so a pandas chunk comes back Arrow-backed
+        buffer = to_arrow_buffer(self.chunk('string', sku=['a1', 'b2']))
+        rows, records, rejected = decode_transformed(transform_arrow_chunk(buffer, self.column_map, ['sku'], 2))
+        self.assertEqual(rows, 2)
+        self.assertEqual(list(records['name']), ['Product A1', 'Product B2'])
+        self.assertTrue(rejected.empty)
+
+    def test_blank_names_fall_back_across_string_storages(self):
+        chunk = self.chunk('string[pyarrow]', sku=['a1', 'b2'])
+        chunk['name'] = pd.array(['Alpha', None], dtype='string')
+        column_map = {**self.column_map, 'name': ['name']}
+        _, records, _ = transform_chunk(chunk, column_map, ['sku', 'name'], 2)
+        self.assertEqual(list(records['name']), ['Alpha', 'Product B2'])
+
+
+@import_settings
+class ImportTests(TransactionTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        media = override_settings(MEDIA_ROOT=self.directory)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.path = os.path.join(self.directory, 'catalog.csv')
+
+    def import_file(self, rows, name='catalog.csv', **processor_options):
+        self.path = os.path.join(self.directory, name)
+        with open(self.path, 'w', newline='') as f:
+            csv.writer(f).writerows(rows)
+        batch = ImportBatch.objects.create(file_name=name, total_records=len(rows) - 1, file_path=self.path)
+        UltraFastCSVProcessor(**processor_options).process_large_csv(self.path, batch.id)
+        batch.refresh_from_db()
+        return batch
+
+    def test_catalogs_without_a_name_column(self):
+        for reader_engine in ('pandas', 'arrow'):
+            Product.objects.all().delete()
+            batch = self.import_file([['product_code', 'desc'], ['A1', 'Anvil'], ['b2', '']], reader_engine=reader_engine)
+            self.assertEqual((batch.status, batch.successful_records), ('completed', 2))
+            self.assertEqual(Product.objects.get(sku='A1').name, 'Product A1')
+
+    def change_counts(self, batch):
+        return batch.created_records, batch.updated_records, batch.unchanged_records
+
+    def test_change_counts_across_reimports(self):
+        rows = [['sku', 'name'], ['A1', 'Alpha'], ['a1', 'Alpha2'], ['B2', 'Beta']]
+        batch = self.import_file(rows)
+        self.assertEqual(self.change_counts(batch), (2, 0, 1))
+        self.assertEqual(Product.objects.get(sku='A1').name, 'Alpha2')
+        updated_at = Product.objects.get(sku='A1').updated_at
+
+        # Only the last row of a repeated SKU is applied, so nothing changes
+        batch = self.import_file(rows)
+        self.assertEqual(self.change_counts(batch), (0, 0, 3))
+        self.assertEqual(Product.objects.get(sku='A1').updated_at, updated_at)
+
+        batch = self.import_file([['sku', 'name'], ['A1', 'Alpha3'], ['C3', 'Gamma']])
+        self.assertEqual(self.change_counts(batch), (1, 1, 0))
+        self.assertEqual(Product.objects.count(), 3)
+
+    def test_overwrite_mode_counts_every_match_as_updated(self):
+        rows = [['sku', 'name'], ['A1', 'Alpha'], ['B2', 'Beta']]
+        self.import_file(rows)
+        batch = self.import_file(rows, upsert_mode='overwrite')
+        self.assertEqual(self.change_counts(batch), (0, 2, 0))
+
+    @override_settings(IMPORT_TRANSFORM_PROCESSES=1)
+    def test_transform_process_pool_without_a_name_column(self):
+        batch = self.import_file([['sku', 'description'], ['A1', 'Anvil'], ['', 'No SKU'], ['b2', '']])
+        self.assertEqual((batch.status, batch.successful_records, batch.failed_records), ('completed', 2, 1))
+        self.assertEqual(Product.objects.get(sku='B2').name, 'Product B2')
+
+    def test_arrow_skips_whitespace_only_lines(self):
+        with open(self.path, 'w', newline='') as f:
+            f.write('sku,name\nA1,Alpha\n   \n\t\nB2,Beta\n')
+        batch = ImportBatch.objects.create(file_name='catalog.csv', total_records=4, file_path=self.path)
+        UltraFastCSVProcessor(reader_engine='arrow').process_large_csv(self.path, batch.id)
+        batch.refresh_from_db()
+        self.assertEqual((batch.status, batch.successful_records, batch.failed_records), ('completed', 2, 0))
+
+    def test_overlong_skus_are_rejected_not_fatal(self):
+        self.assertEqual(Product._meta.get_field('sku').max_length, MAX_SKU_LENGTH)
+        with open(self.path, 'w', newline='') as f:
+            csv.writer(f).writerows([['sku', 'name'], ['A' * 101, 'Too long'], ['B' * 100, 'Fits'], ['', 'Blank']])
+        batch = ImportBatch.objects.create(file_name='catalog.csv', total_records=3, file_path=self.path)
+
+        UltraFastCSVProcessor().process_large_csv(self.path, batch.id)
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, 'completed')
+        self.assertEqual((batch.successful_records, batch.failed_records), (1, 2))
+        self.assertEqual(list(Product.objects.values_list('sku', flat=True)), ['B' * 100])
+        with open(batch.rejects_file, newline='') as f:
+            reasons = [row['reason'] for row in csv.DictReader(f)]
+        self.assertEqual(reasons, ["SKU longer than 100 characters", "No valid SKU found"])
+
+
+class UploadTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        media = override_settings(MEDIA_ROOT=self.directory)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def upload(self, content, name='catalog.csv', **fields):
+        upload = io.BytesIO(content)
+        upload.name = name
+        return self.client.post(reverse('upload-csv'), {'csv_file': upload, **fields})
+
+    def stored_files(self):
+        temp = os.path.join(self.directory, 'temp')
+        return os.listdir(temp) if os.path.isdir(temp) else []
+
+    def assert_rejected(self, response, message):
+        self.assertRedirects(response, reverse('upload-csv'), fetch_redirect_response=False)
+        self.assertIn(message, [str(m) for m in get_messages(response.wsgi_request)])
+        self.assertFalse(ImportBatch.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_accepted_csv_is_hashed_counted_and_kept(self):
+        content = b'SKU,Name\nA1,Alpha\nB2,Beta'
+        response = self.upload(content)
+        batch = ImportBatch.objects.get()
+        self.assertRedirects(response, reverse('upload-status', args=[batch.id]), fetch_redirect_response=False)
+        self.assertEqual(batch.total_records, 2)
+        self.assertEqual(batch.content_hash, hashlib.sha256(content).hexdigest())
+        self.assertEqual(batch.encoding, 'utf-8')
+        with open(batch.file_path, 'rb') as f:
+            self.assertEqual(f.read(), content)
+
+    def test_unsupported_file_types_are_rejected(self):
+        self.assert_rejected(self.upload(b'sku\nA1\n', name='catalog.txt'), 'Please upload a CSV, Parquet or NDJSON file')
+
+    def test_csv_without_a_sku_column_is_rejected_unstored(self):
+        content = b'name,description\n' + b'Alpha,' + b'x' * 200000 + b'\n'
+        self.assert_rejected(self.upload(content), 'No SKU column found in CSV')
+
+    def test_empty_file_is_rejected(self):
+        self.assert_rejected(self.upload(b''), 'File is empty')
+
+    def test_compressed_uploads_are_counted_decompressed_and_stored_compressed(self):
+        content = b'sku,name\n' + b''.join(b'SKU-%d,Product %d\n' % (i, i) for i in range(20000))
+        compressed = gzip.compress(content)
+        self.upload(compressed, name='catalog.csv.gz')
+        batch = ImportBatch.objects.get()
+        self.assertEqual(batch.total_records, 20000)
+        with open(batch.file_path, 'rb') as f:
+            self.assertEqual(f.read(), compressed)
+
+    def test_non_utf8_encoding_is_detected(self):
+        content = 'sku,name\nA1,Crème brûlée façade\nB2,Jalapeño\n'.encode('cp1252')
+        self.upload(content)
+        self.assertIn(ImportBatch.objects.get().encoding, ('cp1252', 'iso8859-1'))
+
+    def test_parquet_row_count_comes_from_the_footer(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        buffer = io.BytesIO()
+        pq.write_table(pa.table({'sku': ['A1', 'B2', 'C3'], 'name': ['a', 'b', 'c']}), buffer)
+        self.upload(buffer.getvalue(), name='catalog.parquet')
+        self.assertEqual(ImportBatch.objects.get().total_records, 3)
+
+    def test_parquet_checks(self):
+        self.assert_rejected(self.upload(b'sku,name\nA1,a\n', name='catalog.parquet'), 'Not a Parquet file')
+
+    def test_identical_file_links_to_the_completed_import(self):
+        content = b'sku,name\nA1,Alpha\n'
+        self.upload(content)
+        batch = ImportBatch.objects.get()
+        batch.mark_completed()
+        response = self.upload(content)
+        self.assertRedirects(response, reverse('upload-status', args=[batch.id]), fetch_redirect_response=False)
+        self.assertEqual(ImportBatch.objects.count(), 1)
+
+    def test_reader_engine_is_chosen_per_upload(self):
+        for choice, stored in (('arrow', 'arrow'), ('', ''), ('bogus', '')):
+            self.upload(b'sku,name\nA1,Alpha\n', reader_engine=choice, force_reimport='1')
+            self.assertEqual(ImportBatch.objects.latest('id').reader_engine, stored)
+
+
+class ProgressStreamTests(TestCase):
+
+    def test_wsgi_requests_are_told_to_poll(self):
+        batch = ImportBatch.objects.create(file_name='catalog.csv', total_records=10)
+        response = self.client.get(reverse('upload-events', args=[batch.id]))
+        self.assertEqual(response.status_code, 501)
+        self.assertNotIsInstance(response, StreamingHttpResponse)
+
+
+class SchedulerTests(TestCase):
+
+    def test_expired_slots_are_reclaimed(self):
+        from uploads import scheduler
+
+        dead = ImportBatch.objects.create(
+            file_name='dead.csv', total_records=500000, status='processing', lane='bulk',
+            dispatched_at=timezone.now() - timedelta(hours=1)
+        )
+        queued = ImportBatch.objects.create(file_name='next.csv', total_records=500000, lane='bulk')
+
+        with override_settings(IMPORT_SLOT_TIMEOUT=60 * 60 * 2):
+            self.assertEqual(scheduler.dispatch(), [])
+        with override_settings(IMPORT_SLOT_TIMEOUT=60 * 30):
+            self.assertEqual(scheduler.dispatch(), [queued.id])
+            self.assertFalse(dead.holds_slot)
+
+    @override_settings(
+        IMPORT_SLOT_TIMEOUT=60 * 30,
+        CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    )
+    def test_periodic_reclaim_fails_dead_imports_and_dispatches(self):
+        from uploads.tasks import reclaim_import_slots
+
+        path = os.path.join(tempfile.mkdtemp(), 'dead.csv')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        open(path, 'w').close()
+        dead = ImportBatch.objects.create(
+            file_name='dead.csv', total_records=500000, status='processing', lane='bulk', file_path=path,
+            dispatched_at=timezone.now() - timedelta(hours=1)
+        )
+        queued = ImportBatch.objects.create(file_name='next.csv', total_records=500000, lane='bulk')
+
+        self.assertEqual(reclaim_import_slots(), [queued.id])
+        dead.refresh_from_db()
+        self.assertEqual((dead.status, dead.dispatched_at), ('failed', None))
+        self.assertTrue(dead.can_resume)
+        self.assertEqual(reclaim_import_slots(), [])
+
+
+class IncrementalDecompressorTests(TestCase):
+
+    def test_zip_skips_directories_and_empty_files(self):
+        text = b'sku,name\n' + b''.join(b'SKU-%d,Product %d\n' % (i, i) for i in range(5000))
+        for method in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            archive = io.BytesIO()
+            with zipfile.ZipFile(archive, 'w', method) as zf:
+                zf.writestr('export/', b'')
+                zf.writestr('export/README', b'')
+                zf.writestr('export/catalog.csv', text)
+            data = archive.getvalue()
+            for size in (1, 29, 64 * 1024):
+                decompressor = IncrementalDecompressor('zip')
+                output = b''.join(decompressor.feed(data[i:i + size]) for i in range(0, len(data), size))
+                self.assertEqual(output, text)
+
+    def test_zip_of_only_directories_is_rejected(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('export/', b'')
+        with self.assertRaisesMessage(ValueError, "exactly one .csv file"):
+            IncrementalDecompressor('zip').feed(archive.getvalue())
+
+
+class EncodingTests(SimpleTestCase):
+
+    def detect(self, *pieces):
+        detector = EncodingDetector()
+        for piece in pieces:
+            detector.feed(piece)
+        return detector.close()
+
+    def test_utf8_and_bom(self):
+        self.assertEqual(self.detect(b'sku,name\nA1,Caf\xc3\xa9\n'), 'utf-8')
+        self.assertEqual(self.detect(b'\xef\xbb\xbfsku,name\n'), 'utf-8-sig')
+
+    def test_character_split_across_chunks_is_still_utf8(self):
+        data = 'sku,name\nA1,Café\n'.encode()
+        split = data.index(b'\xc3') + 1
+        self.assertEqual(self.detect(data[:split], data[split:]), 'utf-8')
+
+    def test_truncated_character_at_the_end_is_not_utf8(self):
+        self.assertNotIn(self.detect(b'sku,name\nA1,Caf\xc3'), ('utf-8', 'utf-8-sig'))
+
+    def test_legacy_single_byte_encoding(self):
+        data = ('sku,name\n' + ''.join(f'A{i},Crème brûlée façade naïve {i}\n' for i in range(200))).encode('cp1252')
+        self.assertIn(self.detect(data), ('cp1252', 'iso8859-1', 'windows-1252'))
+
+    def test_transcoding_stream_reads_utf8(self):
+        stream = io.BufferedReader(TranscodingStream(io.BytesIO('Crème €\n'.encode('cp1252')), 'cp1252', read_size=1))
+        self.assertEqual(stream.read(), 'Crème €\n'.encode())
+
+    def test_open_text_stream_offsets_are_in_utf8_bytes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'catalog.csv')
+        with open(path, 'wb') as f:
+            f.write('sku,name\nA1,Crème\nB2,Beta\n'.encode('cp1252'))
+        offset = len('sku,name\nA1,Crème\n'.encode())
+        with open_text_stream(path, 'cp1252', offset) as stream:
+            self.assertEqual(stream.read(), b'B2,Beta\n')
+
+
+@override_settings(IMPORT_COUNTERS_REDIS_URL=None)
+class ProgressTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(progress, 'publish_progress')
+        self.published = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def statuses(self):
+        return [(call.args[1]['stage'], call.args[1]['processed']) for call in self.published.call_args_list]
+
+    def test_events_are_throttled_but_stage_changes_and_the_end_are_not(self):
+        publisher = progress.ProgressPublisher(1, 100, publish_interval=60)
+        publisher.start('importing', processed=0)
+        publisher.update(processed=10)
+        publisher.update(processed=20)
+        publisher.set_stage('merging')
+        publisher.finish('completed', processed=100)
+        self.assertEqual(self.statuses(), [('importing', 0), ('merging', 20), ('completed', 100)])
+
+    def test_unchanged_progress_is_not_resent(self):
+        publisher = progress.ProgressPublisher(1, 100, publish_interval=0)
+        publisher.update(processed=10)
+        publisher.update(processed=10)
+        publisher.update(processed=20)
+        self.assertEqual([processed for _, processed in self.statuses()], [10, 20])
+
+    def test_hot_counters_fall_back_to_the_database_without_redis(self):
+        batch = ImportBatch.objects.create(file_name='catalog.csv', total_records=100, processed_records=40)
+        self.assertIsNone(progress.HotCounters(batch.id).increment(processed=5))
+        self.assertFalse(progress.ProgressPublisher(batch.id, 100).increment(processed=5))
+        snapshot = progress.batch_progress_snapshot(batch.id)
+        self.assertEqual((snapshot['processed'], snapshot['progress']), (40, 40))
+
+    @override_settings(IMPORT_COUNTERS_REDIS_URL='redis://localhost:6379/0')
+    def test_unreachable_redis_backs_off(self):
+        self.addCleanup(setattr, progress, '_redis_retry_at', 0.0)
+        client = mock.Mock()
+        client.pipeline.return_value.execute.side_effect = ConnectionError("refused")
+        with mock.patch.object(progress, '_redis_client', client):
+            self.assertIsNone(progress.HotCounters(1).set(processed=1))
+            self.assertEqual(client.pipeline.call_count, 1)
+            # Skipped without another timeout while backing off
+            self.assertIsNone(progress.HotCounters(1).set(processed=2))
+            self.assertEqual(client.pipeline.call_count, 1)
+
+
+@override_settings(
+    IMPORT_MIN_CHUNK_SIZE=1000,
+    IMPORT_MAX_CHUNK_SIZE=100000,
+    IMPORT_CHUNK_MEMORY_LIMIT=None,
+    CELERY_WORKER_MAX_MEMORY_PER_CHILD=None,
+)
+class ChunkSizerTests(SimpleTestCase):
+    baseline = 100 * 2 ** 20
+
+    def setUp(self):
+        patcher = mock.patch('uploads.chunking.psutil.Process')
+        self.memory_info = patcher.start().return_value.memory_info
+        self.addCleanup(patcher.stop)
+        self.rss = self.baseline
+
+    @property
+    def rss(self):
+        return self.memory_info.return_value.rss
+
+    @rss.setter
+    def rss(self, value):
+        self.memory_info.return_value = mock.Mock(rss=value)
+
+    def test_grows_while_throughput_improves_then_returns_to_the_best_size(self):
+        sizer = ChunkSizer(10000, adaptive=True)
+        self.assertEqual(sizer.observe(10000, 10000 * 100, 1.0), 15000)
+        # Read ahead at the old size: not evidence for the new one
+        self.assertEqual(sizer.observe(10000, 10000 * 100, 0.1), 15000)
+        self.assertEqual(sizer.observe(15000, 15000 * 100, 1.0), 22500)
+        self.assertEqual(sizer.observe(22500, 22500 * 100, 4.0), 15000)
+        self.assertEqual(sizer.sizes, [10000, 15000, 22500, 15000])
+
+    def test_memory_limit_caps_wide_rows(self):
+        record_bytes = 1000
+        cap = 5000
+        limit = self.baseline + cap * chunks_in_flight() * record_bytes * 3
+        with override_settings(IMPORT_CHUNK_MEMORY_LIMIT=limit):
+            sizer = ChunkSizer(20000, adaptive=True)
+            self.assertEqual(sizer.observe(20000, 20000 * record_bytes, 1.0), cap)
+
+    def test_halves_while_memory_keeps_growing_past_the_limit(self):
+        with override_settings(IMPORT_CHUNK_MEMORY_LIMIT=self.baseline * 100):
+            sizer = ChunkSizer(40000, adaptive=True)
+            self.rss = self.baseline * 101
+            self.assertEqual(sizer.observe(40000, 40000, 1.0), 20000)
+            # Slower than at 40000 rows, and faster later, but 40000 didn't fit
+            self.assertEqual(sizer.observe(20000, 20000, 1.0), 20000)
+            self.assertEqual(sizer.observe(20000, 20000, 0.1), 20000)
+            self.assertEqual(sizer.peak_memory, self.baseline * 101)
+
+    def test_fixed_size_still_records_peak_memory(self):
+        sizer = ChunkSizer(10000, adaptive=False)
+        self.rss = self.baseline * 2
+        self.assertEqual(sizer.observe(10000, 10000, 1.0), 10000)
+        self.assertEqual((sizer.sizes, sizer.peak_memory), ([10000], self.baseline * 2))
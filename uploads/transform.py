@@ -0,0 +1,104 @@
+"""Field extraction for import chunks.
+
+Kept free of Django so ``transform_arrow_chunk`` can run in worker
+processes that never set Django up. Chunks cross the process boundary as
+Arrow IPC buffers: columnar and compact, with no per-value pickling.
+"""
+import pandas as pd
+
+# Product.sku's max_length; longer SKUs would abort the whole write
+MAX_SKU_LENGTH = 100
+
+
+def coalesce_columns(chunk, columns, dtype='string'):
+    """First non-blank stripped value across candidate columns, per row.
+
+    ``dtype`` is the result's string storage when there are no columns to
+    take it from; all NA then.
+    """
+    # Match the reader's string storage (python or pyarrow) to avoid copies
+    if columns and isinstance(chunk[columns[0]].dtype, pd.StringDtype):
+        dtype = chunk[columns[0]].dtype
+    result = pd.Series(pd.NA, index=chunk.index, dtype=dtype)
+
+    for column in columns:
+        values = chunk[column]
+        if not isinstance(values.dtype, pd.StringDtype):
+            values = values.astype('string')
+        values = values.str.strip()
+        values = values.mask(values.eq('') | values.str.upper().eq('NAN'))
+        result = result.fillna(values)
+
+    return result
+
+
+def extract_fields(chunk, column_map):
+    """Vectorized field extraction for a whole chunk.
+
+    Returns the valid rows' records and the reason each other row was
+    rejected, indexed like the chunk.
+    """
+    sku = coalesce_columns(chunk, column_map['sku']).str.upper()
+    reasons = pd.Series(pd.NA, index=chunk.index, dtype='object')
+    reasons[sku.isna()] = "No valid SKU found"
+    reasons[sku.str.len().gt(MAX_SKU_LENGTH).fillna(False)] = f"SKU longer than {MAX_SKU_LENGTH} characters"
+    valid = reasons.isna()
+
+    # Optional columns may be missing, or stored unlike the SKU column
+    name = coalesce_columns(chunk, column_map['name'], sku.dtype).str.slice(0, 255)
+    name = name.fillna(('Product ' + sku).astype(name.dtype))
+
+    description = coalesce_columns(chunk, column_map['description'], sku.dtype).fillna('')
+
+    records = pd.DataFrame({
+        'sku': sku[valid],
+        'name': name[valid],
+        'description': description[valid],
+    })
+    return records, reasons[~valid]
+
+
+def transform_chunk(chunk, column_map, read_columns, first_line):
+    """Split a parsed chunk into records to write and rejected rows.
+
+    Returns the chunk's row count, the records and a frame of rejected
+    rows (file row number, reason and the columns read).
+    """
+    records, reasons = extract_fields(chunk, column_map)
+
+    rejected = chunk.loc[reasons.index, read_columns]
+    rejected.insert(0, 'row', rejected.index + first_line)
+    rejected.insert(1, 'reason', reasons)
+    return len(chunk), records, rejected
+
+
+def to_arrow_buffer(frame):
+    """Serialize a frame, index included, as an Arrow IPC stream"""
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(frame, preserve_index=True)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def from_arrow_buffer(buffer):
+    """Frame from ``to_arrow_buffer``, with Arrow-backed string columns"""
+    import pyarrow as pa
+
+    table = pa.ipc.open_stream(buffer).read_all()
+    string_dtype = pd.StringDtype('pyarrow')
+    return table.to_pandas(types_mapper={pa.string(): string_dtype, pa.large_string(): string_dtype}.get)
+
+
+def transform_arrow_chunk(buffer, column_map, read_columns, first_line):
+    """``transform_chunk`` on an Arrow buffer, returning Arrow buffers"""
+    rows, records, rejected = transform_chunk(from_arrow_buffer(buffer), column_map, read_columns, first_line)
+    return rows, to_arrow_buffer(records), to_arrow_buffer(rejected)
+
+
+def decode_transformed(result):
+    """Unpack a ``transform_arrow_chunk`` result for the writer"""
+    rows, records, rejected = result
+    return rows, from_arrow_buffer(records), from_arrow_buffer(rejected)
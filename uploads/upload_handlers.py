@@ -0,0 +1,221 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+import zipfile
+import zlib
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers, StopUpload
+
+from .compression import IncrementalDecompressor, compression_for, is_accepted, single_zip_entry, zstd_available
+from .encoding import EncodingDetector
+from .readers import arrow_available, input_format_for
+from .services import CSVUploadService
+
+logger = logging.getLogger(__name__)
+
+
+class StreamedCSVFile(UploadedFile):
+    """CSV upload already written to its final temp path"""
+
+    def __init__(self, file, name, content_type, size, charset, content_hash, encoding, headers, record_count):
+        super().__init__(file, name, content_type, size, charset)
+        self.content_hash = content_hash
+        self.detected_encoding = encoding
+        self.headers = headers
+        self.record_count = record_count
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+class StreamingCSVUploadHandler(FileUploadHandler):
+    """Stream the CSV field to disk, hashing and sniffing it as it arrives.
+
+    Memory use is one chunk regardless of file size. Compressed uploads are
+    stored as received and decompressed incrementally for sniffing and
+    counting. NDJSON takes its field names from the first record; Parquet
+    is validated from its footer once the body is on disk. Uploads of an
+    unsupported type or with no SKU column are rejected from the first
+    chunk; the reason is left on ``request.csv_upload_error`` for the view.
+    """
+
+    upload_field = 'csv_file'
+    max_header_bytes = 64 * 1024
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.active = field_name == self.upload_field
+        if not self.active:
+            return
+
+        self.destination = None
+        self.input_format = input_format_for(file_name)
+        if not is_accepted(file_name) and self.input_format == 'csv':
+            self._reject('Please upload a CSV, Parquet or NDJSON file')
+        if self.input_format == 'parquet' and not arrow_available():
+            self._reject('Parquet uploads are not supported on this server')
+        
+        compression = compression_for(file_name)
+        if compression == 'zstd' and not zstd_available():
+            self._reject('Zstandard uploads are not supported on this server')
+        
+        # Compressed uploads stay compressed on disk; only the sniffing and
+        # record counting below see decompressed bytes
+        self.decompressor = IncrementalDecompressor(compression) if compression else None
+
+        temp_name = default_storage.get_available_name(f'temp/{file_name}')
+        path = default_storage.path(temp_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.destination = open(path, 'w+b')
+        self.hasher = hashlib.sha256()
+        self.head = b''
+        self.headers = None
+        self.encoding = None
+        self.detector = EncodingDetector()
+        self.newlines = 0
+        self.last_byte = b''
+
+        # This handler owns the CSV field; don't let others buffer it too
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+
+        self.hasher.update(raw_data)
+        self.destination.write(raw_data)
+
+        if self.input_format == 'parquet':
+            # Schema and row count live in the footer, checked on completion
+            if start == 0 and not raw_data.startswith(b'PAR1'):
+                self._reject('Not a Parquet file')
+            return None
+
+        data = raw_data
+        if self.decompressor:
+            try:
+                data = self.decompressor.feed(raw_data)
+            except (ValueError, zlib.error) as e:
+                self._reject(f"Could not decompress upload: {e}")
+            if not data:
+                return None
+
+        # The whole upload is validated as UTF-8 on the way through
+        self.detector.feed(data)
+
+        if self.headers is None:
+            self.head += data
+            if b'\n' in self.head or len(self.head) >= self.max_header_bytes:
+                self._sniff_header()
+
+        self.newlines += data.count(b'\n')
+        self.last_byte = data[-1:]
+        return None
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+
+        if self.decompressor and self.decompressor.compression == 'zip':
+            self.destination.flush()
+            try:
+                with zipfile.ZipFile(self.destination.name) as archive:
+                    single_zip_entry(archive)
+            except (ValueError, zipfile.BadZipFile) as e:
+                self._reject(str(e))
+
+        self.destination.flush()
+
+        if self.input_format == 'parquet':
+            record_count = self._inspect_parquet()
+        else:
+            if self.headers is None:
+                if not self.head:
+                    self._reject('File is empty')
+                self._sniff_header()
+
+            # An invalid byte after the header can still rule out UTF-8
+            self.encoding = self.detector.close()
+
+            # Last line without a trailing newline, then exclude the CSV header row
+            if self.last_byte and self.last_byte != b'\n':
+                self.newlines += 1
+            record_count = self.newlines if self.input_format == 'ndjson' else max(self.newlines - 1, 0)
+
+        self.destination.seek(0)
+        logger.info(f"Streamed upload {self.file_name} to {self.destination.name} ({file_size} bytes)")
+
+        return StreamedCSVFile(
+            file=self.destination,
+            name=self.file_name,
+            content_type=self.content_type,
+            size=file_size,
+            charset=self.charset,
+            content_hash=self.hasher.hexdigest(),
+            encoding=self.encoding,
+            headers=self.headers,
+            record_count=record_count,
+        )
+
+    def upload_interrupted(self):
+        if getattr(self, 'active', False):
+            self._discard()
+
+    def _sniff_header(self):
+        """Detect encoding and validate the header row from the first bytes"""
+        if b'\x00' in self.head:
+            self._reject('Please upload a CSV file')
+
+        self.encoding = self.detector.encoding
+        line = self.head.split(b'\n', 1)[0]
+
+        try:
+            text = line.decode(self.encoding).lstrip('\ufeff')
+            if self.input_format == 'ndjson':
+                # Field names of the first record stand in for a header
+                headers = list(json.loads(text))
+            else:
+                headers = next(csv.reader([text]), [])
+        except (UnicodeDecodeError, LookupError, csv.Error, ValueError, TypeError) as e:
+            self._reject(f"File validation failed: {e}")
+
+        if not CSVUploadService.has_sku_column(headers):
+            kind = 'NDJSON file' if self.input_format == 'ndjson' else 'CSV'
+            self._reject(f'No SKU column found in {kind}')
+
+        self.headers = headers
+        self.head = b''
+
+    def _inspect_parquet(self):
+        """Validate the schema and read the exact row count from the footer"""
+        import pyarrow.parquet as pq
+
+        try:
+            parquet = pq.ParquetFile(self.destination.name)
+        except Exception as e:
+            self._reject(f"File validation failed: {e}")
+
+        if not CSVUploadService.has_sku_column(parquet.schema_arrow.names):
+            self._reject('No SKU column found in Parquet file')
+
+        self.headers = parquet.schema_arrow.names
+        return parquet.metadata.num_rows
+
+    def _reject(self, message):
+        logger.warning(f"Rejected upload {self.file_name}: {message}")
+        self.request.csv_upload_error = message
+        self._discard()
+        # Drain the rest of the body without storing it
+        raise StopUpload(connection_reset=False)
+
+    def _discard(self):
+        if self.destination:
+            self.destination.close()
+            if os.path.exists(self.destination.name):
+                os.remove(self.destination.name)
+            self.destination = None
@@ -5,4 +5,7 @@ urlpatterns = [
     path('', views.upload_csv, name='upload-csv'),
     path('history/', views.upload_history, name='upload-history'),
     path('status/<int:batch_id>/', views.upload_status, name='upload-status'),
+    path('status/<int:batch_id>/resume/', views.resume_import, name='upload-resume'),
+    path('status/<int:batch_id>/rejects/', views.download_rejects, name='upload-rejects'),
+    path('status/<int:batch_id>/events/', views.upload_progress_stream, name='upload-events'),
 ]
@@ -1,69 +1,99 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 
 # Create your views here.
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
 from django.contrib import messages
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+)
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_POST
+import asyncio
+import json
 import os
-from django.core.files.storage import default_storage
 
+from .progress import TERMINAL_STATUSES, batch_progress_snapshot, progress_group, snapshot_etag
 from .services import CSVUploadService
 from .models import ImportBatch
 
 def upload_csv(request):
     """Handle CSV file upload"""
     if request.method == 'POST' and request.FILES.get('csv_file'):
+        # Already streamed to temp/, hashed and header-checked by StreamingCSVUploadHandler
         csv_file = request.FILES['csv_file']
-        
-        # Validate file type
-        if not csv_file.name.lower().endswith('.csv'):
-            messages.error(request, 'Please upload a CSV file')
-            return redirect('upload-csv')
-        
-        # Save file temporarily
-        temp_path = default_storage.save(f'temp/{csv_file.name}', csv_file)
-        full_path = default_storage.path(temp_path)
+        full_path = csv_file.temporary_file_path()
         
         try:
-            # Validate and get exact count
-            upload_service = CSVUploadService()
-            is_valid, message, exact_count = upload_service.validate_and_count_records(full_path)
-            
-            if not is_valid:
-                messages.error(request, message)
-                default_storage.delete(temp_path)
-                return redirect('upload-csv')
+            exact_count = csv_file.record_count
             
             if exact_count == 0:
                 messages.error(request, 'File appears to be empty or cannot be read')
-                default_storage.delete(temp_path)
+                os.remove(full_path)
                 return redirect('upload-csv')
             
-            # Create import batch with EXACT count
+            upload_service = CSVUploadService()
+            
+            # Identical content already imported - skip unless forced
+            if not request.POST.get('force_reimport'):
+                existing = upload_service.find_completed_duplicate(csv_file.content_hash)
+                if existing:
+                    os.remove(full_path)
+                    messages.info(
+                        request,
+                        f'This file was already imported as "{existing.file_name}" on '
+                        f'{existing.completed_at:%b %d, %Y %H:%M}. Tick "Force re-import" to import it again.'
+                    )
+                    return redirect('upload-status', batch_id=existing.id)
+            
+            # Blank (or unknown) uses IMPORT_READER_ENGINE
+            reader_engine = request.POST.get('reader_engine', '')
+            if reader_engine not in dict(ImportBatch.READER_ENGINE_CHOICES):
+                reader_engine = ''
+            
+            # Create import batch with the streamed record count
             user = request.user if request.user.is_authenticated else None
             batch = upload_service.create_import_batch(
                 file_name=csv_file.name,
                 total_records=exact_count,
-                user=user
+                user=user,
+                content_hash=csv_file.content_hash,
+                file_path=full_path,
+                encoding=csv_file.detected_encoding or '',
+                reader_engine=reader_engine
             )
             
             # Start processing
-            task_id = upload_service.process_csv(full_path, batch.id, user)
+            started = upload_service.process_csv(full_path, batch.id, user)
             
-            messages.success(
-                request, 
-                f'File uploaded successfully! Processing {exact_count:,} records in the background.'
-            )
+            if started:
+                messages.success(
+                    request, 
+                    f'File uploaded successfully! Processing {exact_count:,} records in the background.'
+                )
+            else:
+                messages.success(
+                    request,
+                    f'File uploaded successfully! {exact_count:,} records are queued behind other imports.'
+                )
             
             # REDIRECT TO STATUS PAGE
             return redirect('upload-status', batch_id=batch.id)
             
         except Exception as e:
             messages.error(request, f'Upload failed: {str(e)}')
-            if default_storage.exists(temp_path):
-                default_storage.delete(temp_path)
+            if os.path.exists(full_path):
+                os.remove(full_path)
         
         return redirect('upload-history')
     
+    # Rejected while streaming (not a CSV, no SKU column, ...)
+    if request.method == 'POST' and getattr(request, 'csv_upload_error', None):
+        messages.error(request, request.csv_upload_error)
+        return redirect('upload-csv')
+    
     return render(request, 'uploads/upload.html')
 
 def upload_history(request):
@@ -71,26 +101,47 @@ def upload_history(request):
     batches = ImportBatch.objects.all().order_by('-created_at')[:20]
     return render(request, 'uploads/history.html', {'batches': batches})
 
+@require_POST
+def resume_import(request, batch_id):
+    """Continue a failed import from its last committed chunk"""
+    try:
+        batch = ImportBatch.objects.get(id=batch_id)
+    except ImportBatch.DoesNotExist:
+        messages.error(request, 'Upload batch not found')
+        return redirect('upload-history')
+    
+    if not batch.can_resume:
+        messages.error(request, 'This import cannot be resumed')
+        return redirect('upload-status', batch_id=batch.id)
+    
+    CSVUploadService().resume_import(batch)
+    messages.success(request, f'Resuming import from record {batch.processed_records:,}.')
+    return redirect('upload-status', batch_id=batch.id)
+
+def download_rejects(request, batch_id):
+    """Download the CSV of rows rejected by an import"""
+    batch = get_object_or_404(ImportBatch, pk=batch_id)
+    if not batch.has_rejects_file:
+        raise Http404('No rejected rows for this import')
+    
+    stem = os.path.splitext(os.path.basename(batch.file_name))[0]
+    return FileResponse(
+        open(batch.rejects_file, 'rb'),
+        as_attachment=True,
+        filename=f'{stem}_rejects.csv',
+        content_type='text/csv'
+    )
+
 def upload_status(request, batch_id):
     """Check upload processing status"""
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        snapshot = batch_progress_snapshot(batch_id)
+        if snapshot is not None:
+            return progress_json_response(request, snapshot)
+    
     try:
         batch = ImportBatch.objects.get(id=batch_id)
-        
-        # Calculate progress correctly
-        progress = 0
-        if batch.total_records > 0:
-            progress = int((batch.processed_records / batch.total_records) * 100)
-        
-        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            return JsonResponse({
-                'batch_id': batch.id,
-                'status': batch.status,
-                'processed': batch.processed_records,
-                'total': batch.total_records,
-                'successful': batch.successful_records,
-                'failed': batch.failed_records,
-                'progress': progress
-            })
+        progress = batch.progress
         
         return render(request, 'uploads/status.html', {
             'batch': batch,
@@ -100,4 +151,94 @@ def upload_status(request, batch_id):
     except ImportBatch.DoesNotExist:
         messages.error(request, 'Upload batch not found')
         return redirect('upload-history')
-    
\ No newline at end of file
+    
+def progress_json_response(request, snapshot):
+    """Progress JSON for pollers, with ETag revalidation and a polling hint"""
+    etag = snapshot_etag(snapshot)
+    if_none_match = request.headers.get('If-None-Match', '')
+    if etag in parse_etags(if_none_match) or if_none_match.strip() == '*':
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse(snapshot)
+    
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    if snapshot['status'] not in TERMINAL_STATUSES:
+        response['Retry-After'] = str(getattr(settings, 'IMPORT_STATUS_POLL_INTERVAL', 2))
+    return response
+
+async def upload_progress_stream(request, batch_id):
+    """Server-Sent Events stream of a batch's progress.
+    
+    Sends the current snapshot, then relays the batch's channel-layer
+    progress events until the import completes or fails. A comment line
+    every ``IMPORT_SSE_KEEPALIVE`` seconds keeps proxies from timing out.
+    While the batch is queued, its snapshot (and queue position) is re-sent
+    every ``IMPORT_STATUS_POLL_INTERVAL`` seconds instead.
+    
+    Only served over ASGI: a WSGI server buffers the whole stream and holds
+    a worker thread until the import ends, so there the client is told to
+    poll instead (EventSource gives up on a non-200 response).
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(
+            'Progress streaming needs an ASGI server; poll the status URL instead.',
+            status=501,
+            content_type='text/plain'
+        )
+    
+    snapshot = await sync_to_async(batch_progress_snapshot)(batch_id)
+    if snapshot is None:
+        raise Http404('Upload batch not found')
+    
+    async def events():
+        channel_layer = get_channel_layer()
+        if snapshot['status'] in TERMINAL_STATUSES or channel_layer is None:
+            yield server_sent_event(snapshot)
+            return
+        
+        # Subscribe before taking the snapshot, so a completion can't slip between them
+        channel = await channel_layer.new_channel()
+        await channel_layer.group_add(progress_group(batch_id), channel)
+        try:
+            current = await sync_to_async(batch_progress_snapshot)(batch_id) or snapshot
+            yield server_sent_event(current)
+            if current['status'] in TERMINAL_STATUSES:
+                return
+            
+            while True:
+                queued = current.get('status') == 'pending'
+                try:
+                    event = await asyncio.wait_for(
+                        channel_layer.receive(channel),
+                        timeout=getattr(
+                            settings,
+                            'IMPORT_STATUS_POLL_INTERVAL' if queued else 'IMPORT_SSE_KEEPALIVE',
+                            2 if queued else 15
+                        )
+                    )
+                except asyncio.TimeoutError:
+                    if not queued:
+                        yield ': keep-alive\n\n'
+                        continue
+                    # Queue positions move without progress events
+                    event = await sync_to_async(batch_progress_snapshot)(batch_id) or current
+                    if event == current:
+                        yield ': keep-alive\n\n'
+                        continue
+                
+                current = event
+                event.pop('type', None)
+                yield server_sent_event(event)
+                if event.get('status') in TERMINAL_STATUSES:
+                    break
+        finally:
+            await channel_layer.group_discard(progress_group(batch_id), channel)
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer the stream
+    return response
+
+def server_sent_event(data):
+    return f'event: progress\ndata: {json.dumps(data)}\n\n'